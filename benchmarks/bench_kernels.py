@@ -0,0 +1,83 @@
+# =========================
+# benchmarks/bench_kernels.py — Kernels NumPy vs. Numba
+# =========================
+"""
+Mide los kernels de made4try.kernels con cada backend disponible y comprueba
+que ambos dan el mismo resultado.
+
+    python benchmarks/bench_kernels.py [--samples 36000] [--repeat 5]
+
+Con Numba, la primera llamada (compilación o carga de la caché en disco) se
+reporta aparte como 'warmup'.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from made4try import kernels  # noqa: E402
+
+
+def _synthetic(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    el = np.cumsum(rng.choice([1.0, 1.0, 1.0, 2.0, 30.0], n))
+    w = np.diff(el, prepend=el[0])
+    x = rng.normal(220.0, 60.0, n)
+    x[rng.random(n) < 0.03] = np.nan
+    hr_ok = rng.random(n) > 0.05
+    return el, w, x, hr_ok
+
+
+def _cases(el, w, x, hr_ok):
+    return {
+        "window_scan(1200 s)": lambda: kernels.window_scan(el, w, x, hr_ok, 1200.0),
+        "rolling_time_mean(30 s)": lambda: kernels.rolling_time_mean(el, x, 30.0),
+        "decimate_minmax(2000)": lambda: kernels.decimate_minmax_indices(x, 2000),
+        "segment_ids(10 s)": lambda: kernels.segment_ids(el, 10.0),
+    }
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, tuple):
+        return all(_same(p, q) for p, q in zip(a, b))
+    return np.array_equal(a, b, equal_nan=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--samples", type=int, default=36000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    backends = ["numpy"] + (["numba"] if kernels.HAVE_NUMBA else [])
+    data = _synthetic(args.samples)
+    print(f"muestras={args.samples}  repeticiones={args.repeat}  backends={', '.join(backends)}")
+    if not kernels.HAVE_NUMBA:
+        print("(numba no instalado: solo se mide el backend numpy)")
+    print(f"{'kernel':<26}{'backend':<8}{'warmup ms':>11}{'mejor ms':>11}{'iguales':>9}")
+
+    reference = {}
+    for backend in backends:
+        kernels.set_backend(backend)
+        for name, fn in _cases(*data).items():
+            t0 = time.perf_counter()
+            out = fn()
+            warm = (time.perf_counter() - t0) * 1000.0
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                fn()
+                best = min(best, (time.perf_counter() - t0) * 1000.0)
+            same = _same(reference.setdefault(name, out), out)
+            print(f"{name:<26}{backend:<8}{warm:>11.2f}{best:>11.2f}{'sí' if same else 'NO':>9}")
+    kernels.set_backend("auto")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# =========================
+# made4try/__main__.py — python -m made4try
+# =========================
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -2,17 +2,23 @@
 # made4try/app.py — Punto de entrada Streamlit
 # =========================
 import streamlit as st
-from io import BytesIO
-import zipfile
 import traceback  # para ver el stacktrace en la UI si algo falla
 
 from . import config  # por si quieres reflejar el valor elegido globalmente
-from .config import PAGE_TITLE, PAGE_ICON, LAYOUT, DISPLAY_SMOOTH_SECONDS
-from .utils import clean_base_name
-from .io_tcx import parse_tcx_to_rows, rows_to_dataframe
-from .metrics import add_metrics_minimal
-from .plots import make_plot_loads, make_plot_loads_dual, figure_to_html_bytes
-from .export_xlsx import dataframe_to_xlsx_bytes
+from .config import (
+    PAGE_TITLE, PAGE_ICON, LAYOUT, DISPLAY_SMOOTH_SECONDS,
+    SWEEP_REL_RANGE, SWEEP_FTP_STEP_W, SWEEP_FC20_STEP_BPM, SPOOL_BATCH_MAX_BYTES,
+)
+from .utils import clean_base_name, member_base_name, spooled_file, read_all, close_all
+from .io_tcx import (
+    parse_tcx_to_rows, parse_zip_to_rows, iter_tcx_activities, iter_zip_tcx_activities, rows_to_dataframe,
+)
+from .batch import process_activities, activity_label, build_zip_bundle
+from .merge import merge_recordings
+from .cleaning import clean_activity
+from .metrics import add_metrics_minimal, time_in_zones, load_sufficient_stats, sweep_loads, sweep_range
+from .plots import make_plot_loads, make_plot_loads_dual, make_plot_sweep_heatmap, figure_to_html_bytes
+from .export_xlsx import dataframe_to_xlsx_bytes, SeasonWorkbookWriter
 
 
 def run():
@@ -20,7 +26,7 @@ def run():
     st.set_page_config(page_title=PAGE_TITLE, page_icon=PAGE_ICON, layout=LAYOUT)
     st.title("📈 TCX → XLSX con EFR / IF / ICR / TSS / FSS")
     st.write(
-        "Sube uno o varios **.tcx** o **.tcx.gz**. "
+        "Sube uno o varios **.tcx** o **.tcx.gz** (o un **.zip** con muchos). "
         "Para cada archivo ingresa **FTP (W)** y **FC_20min_max (bpm)**.\n\n"
         "**ICR = IF ÷ EFR**.  TSS=Σ(IF²·Δt_h·100), FSS=Σ(ICR²·Δt_h·100)."
     )
@@ -36,10 +42,50 @@ def run():
         # (opcional) reflejar globalmente el valor elegido
         config.DISPLAY_SMOOTH_SECONDS = int(smooth_secs)
 
+        split_activities = st.checkbox(
+            "Separar actividades (exports multi-actividad)",
+            value=False,
+            help="Cada Activity del TCX (también dentro de un ZIP) se procesa como una "
+                 "actividad independiente (su propio tiempo transcurrido, TSS/FSS y XLSX).",
+        )
+        clean_data = st.checkbox(
+            "Limpiar pausas y huecos",
+            value=True,
+            help="Corta la actividad en segmentos en pausas/pérdidas de señal (el tiempo parado "
+                 "no suma carga).",
+        )
+        fix_spikes = st.checkbox(
+            "Corregir picos de Potencia/FC",
+            value=False,
+            disabled=not clean_data,
+            help="Interpola valores imposibles y glitches aislados de una muestra. "
+                 "Los esfuerzos cortos reales se conservan.",
+        )
+        fix_spikes = clean_data and fix_spikes
+        season = st.checkbox(
+            "Libro consolidado para lotes (ZIP / multi-actividad)",
+            value=False,
+            help="Un solo XLSX con una hoja 'Resumen' (una fila por actividad) en lugar de un XLSX por actividad.",
+        )
+        season_data = st.checkbox(
+            "Incluir hojas de datos por actividad",
+            value=False,
+            disabled=not season,
+        )
+        batch_opts = {
+            "clean": clean_data, "spikes": fix_spikes, "season": season, "season_data": season_data,
+        }
+        merge_sessions = st.checkbox(
+            "Combinar archivos de la misma sesión",
+            value=False,
+            help="Alinea por hora (corrigiendo el desfase de reloj) grabaciones simultáneas, "
+                 "p. ej. potencia del ciclocomputador + FC del reloj, y usa la mejor fuente por señal.",
+        )
+
     # --- Uploader ---
     uploads = st.file_uploader(
         "Sube tus archivos (puedes seleccionar varios)",
-        type=["tcx", "gz"],
+        type=["tcx", "gz", "zip"],
         accept_multiple_files=True,
         key="uploader_main",
     )
@@ -48,8 +94,14 @@ def run():
         st.info("⬆️ Carga archivos para empezar.")
         return
 
-    # --- Procesamiento por archivo ---
+    # --- Fusión: varias grabaciones de la misma sesión ---
     xlsx_buffers = []
+    if merge_sessions and len(uploads) > 1:
+        _process_merged(uploads, int(smooth_secs), clean_data, fix_spikes, xlsx_buffers)
+        close_all(f for _, f in xlsx_buffers)
+        return
+
+    # --- Procesamiento por archivo ---
     for idx, up in enumerate(uploads):
         st.markdown("---")
         base = clean_base_name(up.name)
@@ -72,71 +124,29 @@ def run():
             st.warning("⚠️ Ingresa FTP y FC_20min_max para continuar.")
             continue
 
+        # ZIP / multi-actividad: mismos FTP/FC20 para todas las actividades del archivo
+        if up.name.lower().endswith(".zip"):
+            members = _iter_labeled_zip_activities(up) if split_activities else parse_zip_to_rows(up)
+            _process_batch(up, members, ftp, fc20, int(smooth_secs), batch_opts, xlsx_buffers)
+            continue
+        if split_activities:
+            _process_batch(up, _iter_labeled_activities(up), ftp, fc20, int(smooth_secs), batch_opts, xlsx_buffers)
+            continue
+
         with st.spinner(f"🔄 Procesando {up.name}..."):
             try:
                 # Parseo + métricas
                 rows = parse_tcx_to_rows(up)
                 df_raw = rows_to_dataframe(rows)
+                if clean_data:
+                    df_raw = clean_activity(df_raw, spikes=fix_spikes)
 
                 # PASO CLAVE: pasar smooth_secs al cálculo para que plots use power_smooth/hr_smooth
                 df_final = add_metrics_minimal(
                     df_raw, base_name=base, ftp=ftp, fc20=fc20, smooth_secs=int(smooth_secs)
                 )
 
-                # ---------- Gráfica base ----------
-                st.subheader("📊 Análisis con Señales Base")
-                fig1 = make_plot_loads(
-                    df_final, title=f"Dinámica de Carga – {base}", show_base=True
-                )
-                st.plotly_chart(fig1, use_container_width=True)
-                html1 = figure_to_html_bytes(fig1)
-                st.download_button(
-                    "⬇️ Descargar gráfica completa (HTML)",
-                    data=html1,
-                    file_name=f"{base}_analisis_completo.html",
-                    mime="text/html",
-                    key=f"html_full_{idx}",
-                )
-
-                # ---------- Gráfica dual ----------
-                st.subheader("📈 Comparación: Acumulados vs. Segundo a Segundo")
-                fig2 = make_plot_loads_dual(
-                    df_final, title=f"TSS/FSS: Acumulado vs. Dinámico – {base}"
-                )
-                st.plotly_chart(fig2, use_container_width=True)
-                html2 = figure_to_html_bytes(fig2)
-                st.download_button(
-                    "⬇️ Descargar gráfica dinámica (HTML)",
-                    data=html2,
-                    file_name=f"{base}_dinamica_detallada.html",
-                    mime="text/html",
-                    key=f"html_dyn_{idx}",
-                )
-
-                st.info("💡 Arriba: acumulados + promedios móviles. Abajo: incrementos instantáneos.")
-
-                # ---------- Excel con “gráfica embebida” ----------
-                xlsx_bio = dataframe_to_xlsx_bytes(
-                    df_final, html_chart=html2.decode("utf-8")
-                )
-                out_name = f"{base}.xlsx"
-                xlsx_buffers.append((out_name, xlsx_bio))
-                st.success(f"✅ {out_name} listo (con gráfica embebida)")
-                st.download_button(
-                    f"⬇️ Descargar {out_name}",
-                    data=xlsx_bio.getvalue(),
-                    file_name=out_name,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key=f"xlsx_{idx}",
-                )
-
-                # ---------- Métricas totales ----------
-                tss_total = float(df_final["TSS_total"].iloc[0])
-                fss_total = float(df_final["FSS_total"].iloc[0])
-                c3, c4 = st.columns(2)
-                c3.metric("TSS Total", f"{tss_total:.1f}")
-                c4.metric("FSS Total", f"{fss_total:.1f}")
-
+                _render_results(df_final, base, idx, xlsx_buffers, ftp=ftp, fc20=fc20)
             except Exception as e:
                 # Mensaje legible + traceback completo para diagnóstico
                 st.error(f"❌ Error en {up.name}: {e}")
@@ -144,15 +154,236 @@ def run():
 
     # --- ZIP con todos los Excel (si hay más de uno) ---
     if len(xlsx_buffers) > 1:
-        zip_bio = BytesIO()
-        with zipfile.ZipFile(zip_bio, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for fname, fb in xlsx_buffers:
-                zf.writestr(fname, fb.getvalue())
-        zip_bio.seek(0)
+        bundle = build_zip_bundle(xlsx_buffers)
         st.download_button(
             "📦 Descargar todos (.zip)",
-            data=zip_bio.getvalue(),
+            data=read_all(bundle),
             file_name="tcx_convertidos.zip",
             mime="application/zip",
             key="zip_all",
         )
+        bundle.close()
+    # los XLSX ya se entregaron como bytes: se liberan sus archivos temporales
+    close_all(f for _, f in xlsx_buffers)
+
+def _render_results(df_final, base: str, idx, xlsx_buffers: list, ftp=None, fc20=None):
+    """
+    Gráficas, descargas (HTML/XLSX) y métricas totales de una actividad procesada.
+    'idx' distingue las claves de los widgets. Con ftp/fc20 muestra además la
+    sensibilidad de TSS/FSS a esos parámetros.
+    """
+    # ---------- Gráfica base ----------
+    st.subheader("📊 Análisis con Señales Base")
+    fig1 = make_plot_loads(
+        df_final, title=f"Dinámica de Carga – {base}", show_base=True
+    )
+    st.plotly_chart(fig1, use_container_width=True)
+    html1 = figure_to_html_bytes(fig1)
+    st.download_button(
+        "⬇️ Descargar gráfica completa (HTML)",
+        data=html1,
+        file_name=f"{base}_analisis_completo.html",
+        mime="text/html",
+        key=f"html_full_{idx}",
+    )
+
+    # ---------- Gráfica dual ----------
+    st.subheader("📈 Comparación: Acumulados vs. Segundo a Segundo")
+    fig2 = make_plot_loads_dual(
+        df_final, title=f"TSS/FSS: Acumulado vs. Dinámico – {base}"
+    )
+    st.plotly_chart(fig2, use_container_width=True)
+    html2 = figure_to_html_bytes(fig2)
+    st.download_button(
+        "⬇️ Descargar gráfica dinámica (HTML)",
+        data=html2,
+        file_name=f"{base}_dinamica_detallada.html",
+        mime="text/html",
+        key=f"html_dyn_{idx}",
+    )
+
+    st.info("💡 Arriba: acumulados + promedios móviles. Abajo: incrementos instantáneos.")
+
+    # ---------- Excel con gráficas nativas ----------
+    xlsx_file = dataframe_to_xlsx_bytes(df_final, target=spooled_file(SPOOL_BATCH_MAX_BYTES))
+    out_name = f"{base}.xlsx"
+    xlsx_buffers.append((out_name, xlsx_file))
+    st.success(f"✅ {out_name} listo (con gráficas nativas)")
+    st.download_button(
+        f"⬇️ Descargar {out_name}",
+        data=read_all(xlsx_file),
+        file_name=out_name,
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key=f"xlsx_{idx}",
+    )
+
+    # ---------- Métricas totales ----------
+    tss_total = float(df_final["TSS_total"].iloc[0])
+    fss_total = float(df_final["FSS_total"].iloc[0])
+    c3, c4 = st.columns(2)
+    c3.metric("TSS Total", f"{tss_total:.1f}")
+    c4.metric("FSS Total", f"{fss_total:.1f}")
+
+    # ---------- Pack extendido: NP / VI / kJ + tiempo en zonas ----------
+    if "NP" in df_final.columns:
+        c7, c8, c9 = st.columns(3)
+        np_w, vi = float(df_final["NP"].iloc[0]), float(df_final["VI"].iloc[0])
+        c7.metric("NP (W)", f"{np_w:.0f}" if np_w == np_w else "–")
+        c8.metric("VI", f"{vi:.2f}" if vi == vi else "–")
+        c9.metric("Trabajo (kJ)", f"{float(df_final['work_kJ'].iloc[0]):.0f}")
+        tiz = time_in_zones(df_final)
+        n_z = max(len(tiz["power"]), len(tiz["hr"]))
+        st.dataframe(
+            {
+                "Zona": [f"Z{k + 1}" for k in range(n_z)],
+                "Potencia (min)": [round(v / 60.0, 1) for v in tiz["power"]] + [None] * (n_z - len(tiz["power"])),
+                "FC (min)": [round(v / 60.0, 1) for v in tiz["hr"]] + [None] * (n_z - len(tiz["hr"])),
+            },
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    # ---------- Tiempo en movimiento vs. transcurrido (si hubo limpieza) ----------
+    if "moving_s" in df_final.columns and len(df_final):
+        el = df_final["elapsed_s"]
+        c5, c6 = st.columns(2)
+        c5.metric("Tiempo en movimiento", _fmt_hms(float(df_final["moving_s"].iloc[-1])))
+        c6.metric("Tiempo transcurrido", _fmt_hms(float(el.max() - el.min())))
+
+
+    # ---------- Sensibilidad a FTP / FC20 (sin recalcular el pipeline) ----------
+    if ftp and fc20:
+        with st.expander("🎚️ ¿Y si FTP / FC20 fueran otros? (sensibilidad)"):
+            grid = sweep_loads(
+                load_sufficient_stats(df_final),
+                sweep_range(float(ftp), SWEEP_REL_RANGE, SWEEP_FTP_STEP_W),
+                sweep_range(float(fc20), SWEEP_REL_RANGE, SWEEP_FC20_STEP_BPM),
+            )
+            tss_by_ftp = grid.drop_duplicates("FTP")[["FTP", "TSS_total"]].round(1)
+            st.dataframe(tss_by_ftp.set_index("FTP").T, use_container_width=True)
+            st.plotly_chart(
+                make_plot_sweep_heatmap(grid, f"FSS total según FTP y FC20 – {base}", ftp, fc20),
+                use_container_width=True,
+            )
+
+
+def _fmt_hms(secs: float) -> str:
+    secs = int(round(secs)) if secs == secs else 0
+    return f"{secs // 3600:d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+
+
+def _process_batch(up, activities, ftp, fc20, smooth_secs: int, opts: dict, xlsx_buffers: list):
+    """
+    Procesa un lote de actividades (miembros de un ZIP o actividades de un export
+    multi-actividad): métricas y XLSX por actividad en paralelo, sin gráficas.
+    Con opts["season"], en lugar de un XLSX por actividad se escribe un único libro
+    consolidado (resumen + hojas de datos opcionales) a medida que terminan.
+    """
+    season = opts.get("season", False)
+    writer = None
+    if season:
+        writer = SeasonWorkbookWriter(spooled_file(), data_sheets=opts.get("season_data", False))
+    resumen = []
+    with st.spinner(f"🔄 Procesando {up.name}..."):
+        try:
+            for res in process_activities(
+                activities, ftp=ftp, fc20=fc20, smooth_secs=smooth_secs,
+                clean=opts.get("clean", True), spikes=opts.get("spikes", False), export=not season,
+            ):
+                if res["error"] is not None:
+                    st.error(f"❌ Error en {res['name']}: {res['error']}")
+                    continue
+                df_final = res["df"]
+                # conserva la carpeta del miembro: '2023/ride.tcx' y '2024/ride.tcx' no colisionan
+                name = member_base_name(res["name"])
+                if writer is not None:
+                    writer.add_activity(df_final, name)
+                else:
+                    xlsx_buffers.append((f"{name}.xlsx", res["xlsx"]))
+                resumen.append({
+                    "actividad": name,
+                    "TSS_total": round(float(df_final["TSS_total"].iloc[0]), 1),
+                    "FSS_total": round(float(df_final["FSS_total"].iloc[0]), 1),
+                })
+        except Exception as e:
+            # Errores de la propia fuente (ZIP corrupto, TCX truncado): se conserva
+            # lo ya procesado y se muestra el traceback completo
+            st.error(f"❌ Error en {up.name}: {e}")
+            st.code(traceback.format_exc())
+
+    if resumen:
+        st.success(f"✅ {len(resumen)} actividades procesadas de {up.name}")
+        st.dataframe(resumen, use_container_width=True)
+    if writer is not None:
+        season_file = writer.close()
+        if writer.n_activities:
+            out_name = f"{clean_base_name(up.name)}_temporada.xlsx"
+            st.download_button(
+                f"⬇️ Descargar {out_name}",
+                data=read_all(season_file),
+                file_name=out_name,
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"season_{clean_base_name(up.name)}",
+            )
+        season_file.close()
+
+def _iter_labeled_activities(up):
+    """Actividades de un export multi-actividad con nombres de archivo únicos."""
+    base = clean_base_name(up.name)
+    for n, (act_id, rows) in enumerate(iter_tcx_activities(up), start=1):
+        yield f"{base}_{n:03d}_{activity_label(act_id, n)}", rows
+
+
+def _iter_labeled_zip_activities(up):
+    """Actividades de cada miembro de un ZIP, separadas y con nombres únicos."""
+    for member, n, act_id, rows in iter_zip_tcx_activities(up):
+        if isinstance(rows, Exception):
+            yield member, rows
+        else:
+            yield f"{member_base_name(member)}_{n:03d}_{activity_label(act_id, n)}", rows
+
+
+def _process_merged(uploads, smooth_secs: int, clean_data: bool, fix_spikes: bool, xlsx_buffers: list):
+    """
+    Fusiona varias grabaciones de una misma sesión y procesa el resultado como
+    una sola actividad.
+    """
+    st.markdown("---")
+    names = ", ".join(f"`{up.name}`" for up in uploads)
+    st.subheader(f"🔗 Sesión combinada: {names}")
+    base = f"{clean_base_name(uploads[0].name)}_combinado"
+
+    c1, c2 = st.columns(2)
+    ftp = c1.number_input("FTP (W) – sesión combinada", min_value=1, step=1, key="ftp_merge")
+    fc20 = c2.number_input("FC_20min_max (bpm) – sesión combinada", min_value=1, step=1, key="fc20_merge")
+
+    if not st.button("▶️ Combinar y procesar", key="proc_merge"):
+        return
+    if not (ftp and fc20):
+        st.warning("⚠️ Ingresa FTP y FC_20min_max para continuar.")
+        return
+
+    with st.spinner("🔄 Combinando grabaciones..."):
+        try:
+            frames = [rows_to_dataframe(parse_tcx_to_rows(up)) for up in uploads]
+            df_raw = merge_recordings(frames)
+            if clean_data:
+                df_raw = clean_activity(df_raw, spikes=fix_spikes)
+
+            fuentes = df_raw.attrs.get("merge_sources", {})
+            desfases = df_raw.attrs.get("clock_offsets_s", [])
+            st.dataframe(
+                [{"archivo": up.name,
+                  "desfase_reloj_s": desfases[i] if i < len(desfases) else 0.0,
+                  "señales": ", ".join(c for c, src in fuentes.items() if src == i)}
+                 for i, up in enumerate(uploads)],
+                use_container_width=True,
+            )
+
+            df_final = add_metrics_minimal(
+                df_raw, base_name=base, ftp=ftp, fc20=fc20, smooth_secs=smooth_secs
+            )
+            _render_results(df_final, base, "merge", xlsx_buffers, ftp=ftp, fc20=fc20)
+        except Exception as e:
+            st.error(f"❌ Error al combinar: {e}")
+            st.code(traceback.format_exc())
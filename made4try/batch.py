@@ -0,0 +1,124 @@
+# =========================
+# made4try/batch.py — Procesamiento por lotes (varias actividades)
+# =========================
+from __future__ import annotations
+
+import os
+import shutil
+import time
+import zipfile
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from .cleaning import clean_activity
+from .config import BATCH_MAX_WORKERS, DISPLAY_SMOOTH_SECONDS, SPOOL_BATCH_MAX_BYTES
+from .export_xlsx import dataframe_to_xlsx_bytes
+from .io_tcx import rows_to_dataframe
+from .metrics import add_metrics_minimal
+from .utils import bounded_parallel_map, clean_base_name, spooled_file, unique_name
+
+
+def activity_label(act_id: str, n: int) -> str:
+    """
+    Nombre de archivo seguro para una actividad de un export multi-actividad
+    (su Id es un timestamp ISO: '2024-05-01T08:00:00Z' -> '2024-05-01_080000').
+    """
+    label = (act_id or "").replace("T", "_").replace(":", "").replace("Z", "").strip()
+    return clean_base_name(label) if label else f"actividad_{n}"
+
+
+def _process_one(
+    item: Tuple[str, Any],
+    ftp: float,
+    fc20: float,
+    smooth_secs: int,
+    export: bool,
+    clean: bool,
+    spikes: bool,
+) -> Tuple[Any, bytes | None]:
+    # Se ejecuta en un proceso del pool: devuelve (df_final, bytes del XLSX o None)
+    name, rows = item
+    if isinstance(rows, Exception):
+        raise rows
+    df_raw = rows_to_dataframe(rows)
+    if clean:
+        df_raw = clean_activity(df_raw, spikes=spikes)
+    df_final = add_metrics_minimal(
+        df_raw, base_name=name, ftp=ftp, fc20=fc20, smooth_secs=smooth_secs
+    )
+    xlsx = dataframe_to_xlsx_bytes(df_final).getvalue() if export else None
+    return df_final, xlsx
+
+
+def process_activities(
+    activities: Iterable[Tuple[str, List[Dict[str, Any]]]],
+    ftp: float,
+    fc20: float,
+    smooth_secs: int = DISPLAY_SMOOTH_SECONDS,
+    *,
+    export: bool = True,
+    clean: bool = True,
+    spikes: bool = False,
+    max_workers: int = BATCH_MAX_WORKERS,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Calcula métricas (y opcionalmente el XLSX) de cada actividad en paralelo,
+    pasando antes por cleaning.clean_activity si 'clean' es True (con corrección
+    de picos solo si además 'spikes' es True).
+    'activities' produce (nombre, filas), p. ej. iter_tcx_activities o parse_zip_to_rows,
+    y se consume de forma perezosa: solo 'max_workers' actividades están en vuelo.
+
+    Métricas y exportación retienen el GIL, así que corren en un pool de procesos;
+    el XLSX vuelve como bytes y se copia aquí a un archivo spooled con umbral bajo
+    (SPOOL_BATCH_MAX_BYTES), de modo que un lote grande no se acumula en RAM.
+    El llamador debe cerrar los archivos xlsx cuando ya no los necesite.
+
+    Produce, en orden, dicts con: name, df (DataFrame con métricas), xlsx (archivo
+    spooled o None)
+    y error (excepción o None).
+    """
+    fn = partial(
+        _process_one, ftp=ftp, fc20=fc20, smooth_secs=smooth_secs, export=export, clean=clean,
+        spikes=spikes,
+    )
+    results = bounded_parallel_map(fn, activities, max_workers=max_workers, processes=True)
+    for (name, _), result in results:
+        if isinstance(result, Exception):
+            yield {"name": name, "df": None, "xlsx": None, "error": result}
+            continue
+        df_final, data = result
+        xlsx = None
+        if data is not None:
+            xlsx = spooled_file(SPOOL_BATCH_MAX_BYTES)
+            xlsx.write(data)
+            xlsx.seek(0)
+        yield {"name": name, "df": df_final, "xlsx": xlsx, "error": None}
+
+
+# Formatos ya comprimidos: se guardan tal cual (ZIP_STORED) en el paquete
+_PRECOMPRESSED_EXT = (".xlsx", ".zip", ".gz", ".parquet", ".png", ".jpg")
+
+
+def build_zip_bundle(members: Iterable[Tuple[str, Any]], target=None):
+    """
+    Empaqueta (nombre, archivo binario) en un ZIP escrito en 'target' (por defecto
+    un utils.spooled_file()). Cada miembro se copia por bloques, sin getvalue(),
+    y los formatos ya comprimidos (p. ej. .xlsx) se guardan sin recomprimir.
+    Los nombres repetidos reciben un sufijo (_2, _3, ...) para no duplicar entradas.
+    Devuelve 'target' rebobinado.
+    """
+    out = target if target is not None else spooled_file()
+    used: set = set()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, fobj in members:
+            stem, ext = os.path.splitext(name)
+            name = unique_name(stem, used) + ext
+            stored = name.lower().endswith(_PRECOMPRESSED_EXT)
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            fobj.seek(0)
+            with zf.open(info, "w", force_zip64=True) as dst:
+                shutil.copyfileobj(fobj, dst, 1024 * 1024)
+    out.seek(0)
+    return out
+
@@ -0,0 +1,145 @@
+# =========================
+# made4try/cleaning.py — Limpieza: pausas, huecos y picos
+# =========================
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from . import kernels
+from .config import (
+    SEGMENT_GAP_S, MOVING_MIN_SPEED_MPS,
+    SPIKE_WINDOW_SAMPLES, SPIKE_N_SIGMAS, SPIKE_MAX_RUN_SAMPLES,
+    POWER_MAX_W, POWER_SPIKE_FLOOR_W,
+    HR_MIN_BPM, HR_MAX_BPM, HR_SPIKE_FLOOR_BPM,
+)
+
+
+def _hampel_mask(x: pd.Series, window: int, n_sigmas: float, floor: float) -> pd.Series:
+    """
+    True donde 'x' es un pico según la regla de Hampel con medianas móviles centradas:
+    |x - mediana| > max(n_sigmas · 1.4826 · MAD, floor). Vectorizado (dos rolling).
+    """
+    med = x.rolling(window, center=True, min_periods=1).median()
+    mad = (x - med).abs().rolling(window, center=True, min_periods=1).median()
+    thr = np.maximum(n_sigmas * 1.4826 * mad, floor)
+    return (x - med).abs() > thr
+
+
+def _segment_hampel_mask(
+    x: pd.Series, seg: pd.Series, window: int, n_sigmas: float, floor: float
+) -> pd.Series:
+    """
+    _hampel_mask por segmento en una sola pasada: se intercalan window//2 NaN en
+    cada cambio de segment_id, de modo que ninguna ventana centrada mezcla
+    segmentos (los NaN no cuentan para la mediana), y se vuelve a las posiciones
+    originales. Mismo resultado que agrupar por segmento, sin bucle en Python.
+    """
+    n = len(x)
+    if not n:
+        return pd.Series(False, index=x.index)
+    s = seg.to_numpy()
+    breaks = np.concatenate([[0], np.cumsum(s[1:] != s[:-1])])
+    pos = np.arange(n) + (window // 2) * breaks
+    padded = np.full(pos[-1] + 1, np.nan)
+    padded[pos] = x.to_numpy(dtype=float)
+    flags = _hampel_mask(pd.Series(padded), window, n_sigmas, floor).to_numpy()
+    return pd.Series(flags[pos], index=x.index)
+
+
+def detect_segments(elapsed_s: pd.Series, gap_s: float = SEGMENT_GAP_S) -> pd.Series:
+    """
+    Numera los segmentos continuos de grabación: empieza uno nuevo cada vez que el
+    salto de elapsed_s entre muestras supera 'gap_s' (auto-pausa o pérdida de señal).
+    """
+    el = pd.to_numeric(pd.Series(elapsed_s), errors="coerce").astype(float)
+    return pd.Series(kernels.segment_ids(el.to_numpy(), gap_s), index=el.index)
+
+
+def _short_runs(mask: pd.Series, seg: pd.Series, max_run: int) -> pd.Series:
+    """True donde 'mask' forma rachas de como mucho 'max_run' muestras (dentro del segmento)."""
+    run_id = ((mask != mask.shift()) | (seg != seg.shift())).cumsum()
+    run_len = mask.groupby(run_id).transform("size")
+    return mask & (run_len <= max_run)
+
+
+def _fill_within_segments(x: pd.Series, bad: pd.Series, seg: pd.Series) -> pd.Series:
+    """
+    Sustituye las muestras 'bad' interpolando entre vecinas válidas del mismo segmento
+    (en los bordes, el valor válido más cercano). Las muestras no marcadas no cambian,
+    así que la carga (TSS/NP) no pierde el tiempo de las muestras corregidas.
+    """
+    good = x.notna() & ~bad
+    pos = pd.Series(np.arange(len(x), dtype=float), index=x.index)
+    by_seg_pos, by_seg_val = pos.where(good).groupby(seg), x.where(good).groupby(seg)
+    i0, i1 = by_seg_pos.ffill(), by_seg_pos.bfill()
+    v0, v1 = by_seg_val.ffill(), by_seg_val.bfill()
+    # lineal entre la vecina válida anterior y la siguiente; en los bordes, la más cercana
+    filled = (v0 + (v1 - v0) * (pos - i0) / (i1 - i0)).where(i0.notna() & i1.notna(), v0.fillna(v1))
+    return x.where(~bad, filled)
+
+
+def clean_activity(
+    df: pd.DataFrame,
+    *,
+    gap_s: float = SEGMENT_GAP_S,
+    spikes: bool = False,
+    spike_window: int = SPIKE_WINDOW_SAMPLES,
+    n_sigmas: float = SPIKE_N_SIGMAS,
+    max_spike_run: int = SPIKE_MAX_RUN_SAMPLES,
+) -> pd.DataFrame:
+    """
+    Etapa de limpieza entre rows_to_dataframe y las métricas. Añade:
+      - segment_id: segmento continuo (se corta en pausas/huecos > gap_s)
+      - moving: la muestra cuenta como tiempo en movimiento
+      - moving_s: tiempo en movimiento acumulado (eje compacto, sin pausas)
+    add_metrics_minimal respeta segment_id: el Δt que cruza una pausa no suma
+    carga y las ventanas móviles no mezclan segmentos.
+
+    Con spikes=True (opcional) corrige además en power_w / hr_bpm los valores
+    imposibles (fuera de límites absolutos) y los glitches aislados (rachas de
+    hasta 'max_spike_run' muestras según Hampel por segmento). Las muestras
+    corregidas se interpolan dentro del segmento, nunca se dejan en NaN, y los
+    esfuerzos cortos reales (varias muestras seguidas) se conservan.
+
+    Resumen en df.attrs["cleaning"]. No modifica el original.
+    """
+    m = df.copy()
+    el = pd.to_numeric(m["elapsed_s"], errors="coerce").astype(float)
+    seg = detect_segments(el, gap_s)
+    m["segment_id"] = seg
+
+    # Picos (opcional): límites absolutos + glitches aislados de Hampel por segmento
+    summary = {}
+    for col, lo, hi, floor in (
+        ("power_w", 0.0, POWER_MAX_W, POWER_SPIKE_FLOOR_W),
+        ("hr_bpm", HR_MIN_BPM, HR_MAX_BPM, HR_SPIKE_FLOOR_BPM),
+    ):
+        if not spikes or col not in m.columns:
+            continue
+        x = pd.to_numeric(m[col], errors="coerce").astype(float)
+        impossible = (x < lo) | (x > hi)
+        # 0 W / 0 bpm y valores imposibles son "sin dato" para Hampel (no cuentan como mediana)
+        xv = x.where((x > 0) & ~impossible)
+        hampel = _segment_hampel_mask(xv, seg, spike_window, n_sigmas, floor)
+        bad = impossible | _short_runs(hampel, seg, max_spike_run)
+        m[col] = _fill_within_segments(x, bad, seg)
+        summary[f"{col}_spikes"] = int(bad.sum())
+
+    # Tiempo en movimiento vs. transcurrido
+    dt = el.diff().fillna(0.0).clip(lower=0.0).where(seg.diff().fillna(0) == 0, 0.0)
+    moving = pd.Series(True, index=m.index)
+    if "speed_mps" in m.columns and m["speed_mps"].notna().any():
+        speed = pd.to_numeric(m["speed_mps"], errors="coerce")
+        power = pd.to_numeric(m.get("power_w", pd.Series(np.nan, index=m.index)), errors="coerce")
+        moving = (speed > MOVING_MIN_SPEED_MPS) | (power > 0) | speed.isna()
+    m["moving"] = moving
+    m["moving_s"] = (dt * moving).cumsum()
+
+    summary.update({
+        "segments": int(seg.iloc[-1]) + 1 if len(seg) else 0,
+        "elapsed_time_s": float(el.max() - el.min()) if el.notna().any() else 0.0,
+        "moving_time_s": float(m["moving_s"].iloc[-1]) if len(m) else 0.0,
+    })
+    m.attrs["cleaning"] = summary
+    return m
@@ -0,0 +1,97 @@
+# =========================
+# made4try/cli.py — Línea de comandos
+# =========================
+"""
+Conversión y sensibilidad FTP/FC20 desde la terminal:
+
+    python -m made4try actividad.tcx.gz --ftp 265 --fc20 170 [-o salida.xlsx]
+    python -m made4try actividad.tcx --ftp 265 --fc20 170 --sweep-ftp 240:290:5 --sweep-fc20 160:180:2
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+import numpy as np
+
+from .cleaning import clean_activity
+from .export_xlsx import dataframe_to_xlsx_bytes
+from .io_tcx import parse_tcx_source_to_rows, rows_to_dataframe
+from .metrics import add_metrics_minimal, activity_summary, load_sufficient_stats, sweep_loads
+from .utils import clean_base_name
+
+
+def _parse_range(text: str) -> np.ndarray:
+    """
+    '240:290:5' → 240, 245, ..., 290 (fin incluido); '250,265' → 250, 265.
+    Todos los valores deben ser > 0 (FTP/FC20 dividen la carga) y fin >= inicio.
+    """
+    try:
+        if ":" in text:
+            parts = [float(p) for p in text.split(":")]
+            if len(parts) != 3 or parts[2] <= 0:
+                raise argparse.ArgumentTypeError("usa inicio:fin:paso con paso > 0, p. ej. 240:290:5")
+            start, stop, step = parts
+            if stop < start:
+                raise argparse.ArgumentTypeError(f"fin ({stop:g}) menor que inicio ({start:g})")
+            values = np.arange(start, stop + step / 2.0, step)
+        else:
+            values = np.array([float(p) for p in text.split(",") if p.strip()])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"valores no numéricos: {text!r}")
+    if values.size == 0:
+        raise argparse.ArgumentTypeError("rango vacío")
+    if (values <= 0).any() or not np.isfinite(values).all():
+        raise argparse.ArgumentTypeError("todos los valores deben ser > 0")
+    return values
+
+
+def _positive_float(text: str) -> float:
+    """Tipo argparse para FTP/FC20: número finito > 0 (dividen la carga)."""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"valor no numérico: {text!r}")
+    if not (np.isfinite(value) and value > 0):
+        raise argparse.ArgumentTypeError(f"debe ser > 0: {text!r}")
+    return value
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="made4try", description="TCX → XLSX con EFR / IF / ICR / TSS / FSS")
+    ap.add_argument("archivo", help=".tcx o .tcx.gz")
+    ap.add_argument("--ftp", type=_positive_float, required=True, help="FTP (W)")
+    ap.add_argument("--fc20", type=_positive_float, required=True, help="FC_20min_max (bpm)")
+    ap.add_argument("-o", "--output", help="XLSX de salida (opcional)")
+    ap.add_argument("--no-clean", action="store_true", help="no limpiar pausas/huecos")
+    ap.add_argument("--fix-spikes", action="store_true",
+                    help="corregir valores imposibles y glitches aislados de Potencia/FC")
+    ap.add_argument("--sweep-ftp", type=_parse_range, help="rejilla de FTP: inicio:fin:paso o lista a,b,c")
+    ap.add_argument("--sweep-fc20", type=_parse_range, help="rejilla de FC20: inicio:fin:paso o lista a,b,c")
+    args = ap.parse_args(argv)
+
+    df_raw = rows_to_dataframe(parse_tcx_source_to_rows(args.archivo))
+    if not args.no_clean:
+        df_raw = clean_activity(df_raw, spikes=args.fix_spikes)
+    base = clean_base_name(args.archivo)
+    df_final = add_metrics_minimal(df_raw, base_name=base, ftp=args.ftp, fc20=args.fc20)
+
+    summary = activity_summary(df_final)
+    print(f"{base}: TSS={summary['TSS_total']:.1f}  FSS={summary['FSS_total']:.1f}  "
+          f"NP={summary.get('NP', float('nan')):.0f} W")
+
+    if args.output:
+        with open(args.output, "wb") as out:
+            dataframe_to_xlsx_bytes(df_final, target=out)
+        print(f"XLSX: {args.output}")
+
+    if args.sweep_ftp is not None or args.sweep_fc20 is not None:
+        ftps = args.sweep_ftp if args.sweep_ftp is not None else np.array([args.ftp])
+        fc20s = args.sweep_fc20 if args.sweep_fc20 is not None else np.array([args.fc20])
+        grid = sweep_loads(load_sufficient_stats(df_final), ftps, fc20s)
+        print(grid.round({"TSS_total": 1, "FSS_total": 1}).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
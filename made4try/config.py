@@ -14,12 +14,68 @@ ROLLING_WINDOW_SECONDS = 30
 # Suavizado visual de Potencia/FC (no afecta TSS/FSS). Lo puede sobreescribir el slider.
 DISPLAY_SMOOTH_SECONDS = 5
 
+# Zonas (límites inferiores de Z2..Zn, en % de FTP y % de FC_20min_max)
+POWER_ZONE_EDGES_PCT = [55, 75, 90, 105, 120, 150]   # Coggan: Z1..Z7
+HR_ZONE_EDGES_PCT = [81, 90, 94, 100]                # Friel (umbral ≈ FC20): Z1..Z5
+
+# Sensibilidad de TSS/FSS: rejilla alrededor de los valores actuales (±rango, paso)
+SWEEP_REL_RANGE = 0.10
+SWEEP_FTP_STEP_W = 5.0
+SWEEP_FC20_STEP_BPM = 2.0
+
+# Ventana de "mejor esfuerzo" (s) en el resumen por actividad
+BEST_WINDOW_SECONDS = 1200
+
 # Ventana para rellenar FC inválida (NaN/<=0) al calcular FSS (sí afecta FSS)
 HR_FILL_MA_SECONDS = 30
 
+# Lotes ZIP: número de miembros que se parsean en paralelo (y máximo en memoria a la vez)
+ZIP_MAX_WORKERS = 4
+
+# Lotes multi-actividad: actividades con métricas/export en paralelo (y en memoria a la vez)
+BATCH_MAX_WORKERS = 4
+
+# Fusión de grabaciones de una misma sesión (p. ej. ciclocomputador + reloj)
+MERGE_TOLERANCE_S = 2.0      # distancia máxima al vecino más cercano en el as-of join
+MERGE_MAX_OFFSET_S = 300.0   # desfase de reloj máximo que se busca entre equipos
+MERGE_MIN_OVERLAP_S = 60.0   # solape mínimo de señal para aceptar un desfase
+MERGE_MIN_CORR = 0.2         # correlación normalizada mínima del pico para aceptar un desfase
+MERGE_MIN_GAIN = 0.01        # el pico debe superar al desfase 0 en al menos esto; si no, 0
+
+# --------- Limpieza (pausas, huecos y picos) ----------
+SEGMENT_GAP_S = 10.0          # salto de tiempo que corta un segmento (auto-pausa / pérdida de señal)
+MOVING_MIN_SPEED_MPS = 0.5    # por debajo (y sin potencia) la muestra no cuenta como movimiento
+SPIKE_WINDOW_SAMPLES = 7      # ventana (muestras) de la mediana móvil para detectar picos
+SPIKE_N_SIGMAS = 4.0          # umbral de Hampel en desviaciones robustas (1.4826·MAD)
+SPIKE_MAX_RUN_SAMPLES = 1     # solo se corrigen picos aislados: rachas más largas son esfuerzos reales
+POWER_MAX_W = 2500.0
+POWER_SPIKE_FLOOR_W = 150.0   # desviación mínima a la mediana para considerar pico de potencia
+HR_MIN_BPM = 30.0
+HR_MAX_BPM = 230.0
+HR_SPIKE_FLOOR_BPM = 15.0
+
+# Salidas (XLSX / ZIP): por encima de este tamaño se vuelcan a un archivo temporal
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# Salidas que se acumulan (un XLSX por actividad en lotes, ~1 MB cada uno): a disco casi siempre
+SPOOL_BATCH_MAX_BYTES = 64 * 1024
+
+# --------- Servicio HTTP (made4try.service) ----------
+SERVICE_MAX_WORKERS = 2                      # procesos de conversión
+SERVICE_MAX_PENDING = 16                     # conversiones admitidas a la vez (el resto → 503)
+SERVICE_CACHE_ITEMS = 64                     # resultados en caché (LRU por hash del contenido)
+SERVICE_TIMEOUT_S = 120.0
+SERVICE_MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+
 # Nombre de la hoja en Excel
 DEFAULT_SHEET_NAME = "DATA"
 
+# Hoja de resumen del libro consolidado (una fila por actividad)
+SEASON_SUMMARY_SHEET_NAME = "Resumen"
+
+# Gráficas nativas en Excel: hoja con la serie diezmada y nº máximo de puntos
+CHART_DATA_SHEET_NAME = "DatosGrafica"
+CHART_MAX_POINTS = 2000
+
 # --------- Namespaces TCX ----------
 NS = {
     "tcx": "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2",
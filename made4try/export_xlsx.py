@@ -1,11 +1,19 @@
 # =========================
 # made4try/export_xlsx.py
 # =========================
+from __future__ import annotations
+
+import re
 from io import BytesIO
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.chart import ScatterChart, Reference, Series
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Alignment
-from .config import DEFAULT_SHEET_NAME
+from .config import DEFAULT_SHEET_NAME, CHART_DATA_SHEET_NAME, CHART_MAX_POINTS, SEASON_SUMMARY_SHEET_NAME
+from .metrics import activity_summary, time_in_zones
+from .utils import decimate_minmax_indices
 
 def _set_col_widths(ws, df: pd.DataFrame):
     """
@@ -18,13 +26,14 @@ def _set_col_widths(ws, df: pd.DataFrame):
 
     # Columnas con números más anchos
     medium_cols = {
-        "elapsed_s", "dt_s", "distance_m",
+        "elapsed_s", "dt_s", "moving_s", "distance_m",
         "power_w", "power_smooth", "power_ma30",
         "hr_bpm", "hr_smooth", "hr_ma30",
         "speed_mps", "speed_kmh",
         "pct_ftp", "pct_fc_rel", "EFR", "IF", "ICR",
         "TSS_inc", "FSS_inc", "TSS_inc_ma30", "FSS_inc_ma30",
         "TSS", "FSS", "TSS_total", "FSS_total",
+        "NP", "VI", "work_kJ",
     }
 
     for idx, col in enumerate(df.columns, start=1):
@@ -64,8 +73,8 @@ def _apply_number_formats(ws, df: pd.DataFrame):
     # Mapas de formatos por nombre de columna
     pct_cols = {"pct_ftp", "pct_fc_rel"}  # porcentaje
     one_dec_cols = {"speed_kmh"}          # 1 decimal
-    two_dec_cols = {"EFR", "IF", "ICR"}   # 2 decimales
-    one_dec_load = {"TSS", "FSS", "TSS_total", "FSS_total"}
+    two_dec_cols = {"EFR", "IF", "ICR", "VI"}   # 2 decimales
+    one_dec_load = {"TSS", "FSS", "TSS_total", "FSS_total", "NP", "work_kJ"}
     four_dec_inc = {"TSS_inc", "FSS_inc", "TSS_inc_ma30", "FSS_inc_ma30"}
 
     name_to_idx = {name: idx for idx, name in enumerate(df.columns, start=1)}
@@ -105,17 +114,122 @@ def _apply_number_formats(ws, df: pd.DataFrame):
             for row in range(2, ws.max_row + 1):
                 ws.cell(row=row, column=col_idx).number_format = "0.0000"
 
+def _chart_data_frame(df: pd.DataFrame, max_points: int = CHART_MAX_POINTS) -> pd.DataFrame:
+    """
+    Serie compacta para las gráficas nativas: tiempo en minutos + TSS/FSS acumulados
+    y ΔTSS/ΔFSS (MA30), diezmada por min/max de las MA para conservar los picos.
+    """
+    cols = [c for c in ("TSS", "FSS", "TSS_inc_ma30", "FSS_inc_ma30") if c in df.columns]
+    if "elapsed_s" not in df.columns or not cols or not len(df):
+        return pd.DataFrame()
+    ma_cols = [c for c in ("TSS_inc_ma30", "FSS_inc_ma30") if c in cols] or cols[:1]
+    per_series = max(2, max_points // len(ma_cols))
+    idx = np.unique(np.concatenate([decimate_minmax_indices(df[c], per_series) for c in ma_cols]))
+    out = df.iloc[idx][cols].copy()
+    out.insert(0, "tiempo_min", pd.to_numeric(df["elapsed_s"].iloc[idx], errors="coerce") / 60.0)
+    return out.reset_index(drop=True)
+
+
+def _line_chart(ws_data, title: str, y_title: str, cols: list[int], n_rows: int) -> ScatterChart:
+    """Gráfica de líneas (dispersión sin marcadores) sobre la hoja de datos de gráfica."""
+    ch = ScatterChart()
+    ch.title = title
+    ch.style = 13
+    ch.height, ch.width = 9, 22
+    ch.x_axis.title = "Tiempo (min)"
+    ch.y_axis.title = y_title
+    ch.x_axis.delete = False
+    ch.y_axis.delete = False
+    x = Reference(ws_data, min_col=1, min_row=2, max_row=n_rows + 1)
+    for col in cols:
+        y = Reference(ws_data, min_col=col, min_row=1, max_row=n_rows + 1)
+        series = Series(y, x, title_from_data=True)
+        series.marker.symbol = "none"
+        series.smooth = False
+        ch.series.append(series)
+    return ch
+
+
+def _add_native_charts(book, df: pd.DataFrame):
+    """
+    Hoja CHART_DATA_SHEET_NAME con la serie diezmada + hoja 'Gráficas' con gráficas
+    nativas de Excel (TSS/FSS acumulados y ΔTSS/ΔFSS MA30) que la referencian.
+    """
+    data = _chart_data_frame(df)
+    if data.empty:
+        return
+
+    ws_data = book.create_sheet(CHART_DATA_SHEET_NAME)
+    ws_data.append(list(data.columns))
+    for row in data.itertuples(index=False):
+        ws_data.append([None if pd.isna(v) else float(v) for v in row])
+
+    col_of = {name: i for i, name in enumerate(data.columns, start=1)}
+    n = len(data)
+    ws_chart = book.create_sheet("Gráficas")
+    ws_chart["A1"] = "Dinámica de Carga"
+    ws_chart["A1"].font = Font(bold=True, size=14)
+
+    acum = [col_of[c] for c in ("TSS", "FSS") if c in col_of]
+    if acum:
+        ws_chart.add_chart(_line_chart(ws_data, "TSS/FSS acumulados", "Carga acumulada", acum, n), "A3")
+    ma = [col_of[c] for c in ("TSS_inc_ma30", "FSS_inc_ma30") if c in col_of]
+    if ma:
+        ws_chart.add_chart(_line_chart(ws_data, "ΔTSS/ΔFSS (MA30s)", "Carga por muestra", ma, n), "A22")
+
+
+def _add_summary_sheet(book, df: pd.DataFrame):
+    """
+    Hoja 'Resumen' con los totales de la actividad (TSS/FSS, NP, VI, kJ, mejores
+    ventanas) y el tiempo en zonas de potencia y FC.
+    """
+    if "TSS_total" not in df.columns or not len(df):
+        return
+    summary = activity_summary(df)
+    ws = book.create_sheet(SEASON_SUMMARY_SHEET_NAME, 1)
+    ws["A1"] = "Resumen de la actividad"
+    ws["A1"].font = Font(bold=True, size=14)
+
+    row = 3
+    for key, value in summary.items():
+        if key.startswith(("pot_Z", "fc_Z")):
+            continue
+        ws.cell(row=row, column=1, value=key).font = Font(bold=True)
+        ws.cell(row=row, column=2, value=_cell_value(value))
+        row += 1
+
+    tiz = time_in_zones(df)
+    row += 1
+    for col, header in enumerate(("Zona", "Potencia (min)", "FC (min)"), start=1):
+        ws.cell(row=row, column=col, value=header).font = Font(bold=True)
+    for k in range(max(len(tiz["power"]), len(tiz["hr"]))):
+        row += 1
+        ws.cell(row=row, column=1, value=f"Z{k + 1}")
+        if k < len(tiz["power"]):
+            ws.cell(row=row, column=2, value=round(tiz["power"][k] / 60.0, 1))
+        if k < len(tiz["hr"]):
+            ws.cell(row=row, column=3, value=round(tiz["hr"][k] / 60.0, 1))
+
+    ws.column_dimensions["A"].width = 24
+    ws.column_dimensions["B"].width = 18
+    ws.column_dimensions["C"].width = 12
+
+
 def dataframe_to_xlsx_bytes(
     df: pd.DataFrame,
-    html_chart: str | None = None,
     sheet_name: str = DEFAULT_SHEET_NAME,
-) -> BytesIO:
+    charts: bool = True,
+    target=None,
+):
     """
-    Exporta un DataFrame a un buffer XLSX en memoria, con:
+    Exporta un DataFrame a un buffer XLSX (BytesIO, o 'target' si se pasa, p. ej.
+    utils.spooled_file()), con:
       - hoja de datos (ancho de columnas + filtros + formatos)
-      - hoja 'Gráficas' con preview de HTML (si se pasa html_chart)
+      - hoja 'Resumen' con totales y tiempo en zonas (si el DataFrame trae métricas)
+      - hoja 'Gráficas' con gráficas nativas de Excel sobre una serie diezmada
+        (si charts=True y el DataFrame trae TSS/FSS)
     """
-    bio = BytesIO()
+    bio = target if target is not None else BytesIO()
     with pd.ExcelWriter(bio, engine="openpyxl") as xw:
         # Hoja de datos
         df.to_excel(xw, index=False, sheet_name=sheet_name)
@@ -124,28 +238,92 @@ def dataframe_to_xlsx_bytes(
         _set_col_widths(ws, df)
         _apply_table_style(ws, df)
         _apply_number_formats(ws, df)
+        _add_summary_sheet(xw.book, df)
 
-        # Hoja de gráficas (preview HTML)
-        if html_chart:
-            chart_sheet = xw.book.create_sheet("Gráficas")
+        # Gráficas nativas
+        if charts:
+            _add_native_charts(xw.book, df)
 
-            # Título
-            chart_sheet["A1"] = "Gráfica Interactiva de Carga"
-            chart_sheet["A1"].font = Font(bold=True, size=14)
+    bio.seek(0)
+    return bio
 
-            # Nota
-            chart_sheet["A3"] = "Para ver la gráfica interactiva completa, usa el archivo HTML descargado."
-            chart_sheet["A3"].font = Font(italic=True)
 
-            # Vista previa (texto)
-            chart_sheet["A5"] = "Vista previa (HTML):"
-            preview = html_chart[:500] + ("..." if len(html_chart) > 500 else "")
-            chart_sheet["A6"] = preview
-            chart_sheet["A6"].alignment = Alignment(wrap_text=True)
+# ---------- Libro consolidado (temporada), escritura en streaming ----------
 
-            # Ajuste de ancho para lectura
-            chart_sheet.column_dimensions["A"].width = 100
-            chart_sheet.row_dimensions[6].height = 140
+def _cell_value(v):
+    """Valor apto para openpyxl (NaN/NaT → celda vacía, numpy → Python)."""
+    if v is None:
+        return None
+    try:
+        if pd.isna(v):
+            return None
+    except (TypeError, ValueError):
+        return v
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    return v
 
-    bio.seek(0)
-    return bio
+
+class SeasonWorkbookWriter:
+    """
+    Libro XLSX único para un lote de actividades, escrito en modo write_only:
+      - hoja SEASON_SUMMARY_SHEET_NAME con una fila por actividad (metrics.activity_summary)
+      - opcionalmente, una hoja de datos por actividad
+    Cada add_activity vuelca sus filas al momento, así que la memoria queda acotada
+    por la actividad en curso y no por el tamaño del lote.
+
+        writer = SeasonWorkbookWriter(data_sheets=False)
+        for df_final in ...:
+            writer.add_activity(df_final, name)
+        bio = writer.close()
+    """
+
+    def __init__(self, target=None, *, data_sheets: bool = False):
+        self.target = target if target is not None else BytesIO()
+        self.data_sheets = data_sheets
+        self._wb = Workbook(write_only=True)
+        self._summary = self._wb.create_sheet(SEASON_SUMMARY_SHEET_NAME)
+        self._summary.freeze_panes = "A2"
+        self._summary_cols: list[str] | None = None
+        self._sheet_names: set[str] = {SEASON_SUMMARY_SHEET_NAME}
+        self.n_activities = 0
+
+    def _unique_sheet_name(self, name: str) -> str:
+        base = re.sub(r"[\[\]:*?/\\]", "_", str(name or "actividad"))[:31] or "actividad"
+        title, k = base, 1
+        while title in self._sheet_names:
+            k += 1
+            suffix = f"_{k}"
+            title = base[:31 - len(suffix)] + suffix
+        self._sheet_names.add(title)
+        return title
+
+    def add_activity(self, df: pd.DataFrame, name: str | None = None) -> dict:
+        """Añade la fila de resumen (y la hoja de datos si procede). Devuelve el resumen."""
+        summary = activity_summary(df, name)
+        if self._summary_cols is None:
+            self._summary_cols = list(summary.keys())
+            self._summary.append(self._summary_cols)
+        self._summary.append([_cell_value(summary.get(c)) for c in self._summary_cols])
+
+        if self.data_sheets:
+            ws = self._wb.create_sheet(self._unique_sheet_name(summary["actividad"]))
+            ws.freeze_panes = "A2"
+            _set_col_widths(ws, df)
+            ws.append(list(df.columns))
+            for row in df.itertuples(index=False, name=None):
+                ws.append([_cell_value(v) for v in row])
+
+        self.n_activities += 1
+        return summary
+
+    def close(self):
+        """Guarda el libro en 'target' y lo devuelve (rebobinado si es un buffer)."""
+        if self._summary_cols is None:
+            self._summary.append(["Sin actividades"])
+        self._wb.save(self.target)
+        if hasattr(self.target, "seek"):
+            self.target.seek(0)
+        return self.target
@@ -4,14 +4,17 @@
 from __future__ import annotations
 
 import gzip
-from io import BytesIO, TextIOWrapper
+import os
+import zipfile
+from io import BytesIO
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from typing import Iterable, List, Dict, Any, Optional
+from typing import Iterable, Iterator, List, Dict, Any, Optional, BinaryIO, Tuple
 
 import pandas as pd
 
-from .config import NS
+from .config import NS, ZIP_MAX_WORKERS
+from .utils import bounded_parallel_map
 
 
 # ---------- Utilidades de parseo ----------
@@ -59,17 +62,33 @@ def _to_int(x: Any) -> Optional[int]:
         return None
 
 
-def _open_maybe_gzip_bytes(uploaded_file) -> TextIOWrapper:
+def _open_maybe_gzip_stream(fileobj: BinaryIO, name: str) -> BinaryIO:
     """
-    Devuelve un manejador de texto UTF-8 para un archivo subido .tcx o .tcx.gz.
+    Envuelve un stream binario (.tcx o .tcx.gz) sin leerlo completo a memoria.
+    Si 'name' termina en .gz, descomprime al vuelo con GzipFile.
+    """
+    if (name or "").lower().endswith(".gz"):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    return fileobj
+
+
+def _open_maybe_gzip_bytes(uploaded_file) -> BinaryIO:
+    """
+    Devuelve un stream binario para un archivo subido .tcx o .tcx.gz.
     'uploaded_file' debe exponer .name y .getvalue() (como los de Streamlit).
+    Si además es seekable, se usa el propio buffer (evita copiarlo con getvalue()).
     """
-    name = (uploaded_file.name or "").lower()
-    raw = uploaded_file.getvalue()
-    if name.endswith(".gz"):
-        gz = gzip.GzipFile(fileobj=BytesIO(raw), mode="rb")
-        return TextIOWrapper(gz, encoding="utf-8")
-    return TextIOWrapper(BytesIO(raw), encoding="utf-8")
+    name = uploaded_file.name or ""
+    if hasattr(uploaded_file, "seek") and hasattr(uploaded_file, "read"):
+        uploaded_file.seek(0)
+        return _open_maybe_gzip_stream(uploaded_file, name)
+    return _open_maybe_gzip_stream(BytesIO(uploaded_file.getvalue()), name)
+
+
+def is_tcx_name(name: str) -> bool:
+    """True si el nombre corresponde a un .tcx o .tcx.gz (case-insensitive)."""
+    low = (name or "").lower()
+    return low.endswith(".tcx") or low.endswith(".tcx.gz")
 
 
 # ---------- Parseo a filas (dicts) ----------
@@ -79,75 +98,230 @@ def parse_tcx_to_rows(uploaded_file) -> List[Dict[str, Any]]:
     Parsea un archivo TCX y devuelve una lista de dicts (uno por Trackpoint).
     Campos estándar + extensiones comunes de Garmin (ns2/ns3).
     """
-    f = _open_maybe_gzip_bytes(uploaded_file)
-    tree = ET.parse(f)
+    return parse_tcx_stream_to_rows(_open_maybe_gzip_bytes(uploaded_file))
+
+
+def parse_tcx_stream_to_rows(stream: BinaryIO) -> List[Dict[str, Any]]:
+    """
+    Igual que parse_tcx_to_rows, pero a partir de un stream binario ya abierto
+    (p. ej. un miembro de un ZIP abierto con ZipFile.open()).
+    """
+    tree = ET.parse(stream)
     root = tree.getroot()
 
     rows: List[Dict[str, Any]] = []
     first_ts: Optional[datetime] = None
 
-    # Actividades → Laps → Tracks → Trackpoints
+    # Actividades → Laps → Tracks → Trackpoints (todas fusionadas, base de tiempo común)
     for act in root.findall(".//tcx:Activities/tcx:Activity", NS):
-        sport = act.get("Sport")
-        for li, lap in enumerate(act.findall("tcx:Lap", NS), start=1):
-            for track in lap.findall("tcx:Track", NS):
-                for ti, tp in enumerate(track.findall("tcx:Trackpoint", NS), start=1):
-                    # Tiempo
-                    ts_txt = _get_text(tp, ["tcx:Time"])
-                    ts = _parse_iso8601_z(ts_txt) if ts_txt else None
-                    if ts and first_ts is None:
-                        first_ts = ts
-                    elapsed = (ts - first_ts).total_seconds() if (ts and first_ts) else None
-
-                    # Posición / métricas básicas
-                    lat = _to_float(_get_text(tp, ["tcx:Position/tcx:LatitudeDegrees"]))
-                    lon = _to_float(_get_text(tp, ["tcx:Position/tcx:LongitudeDegrees"]))
-                    alt = _to_float(_get_text(tp, ["tcx:AltitudeMeters"]))
-                    dist = _to_float(_get_text(tp, ["tcx:DistanceMeters"]))
-                    hr   = _to_int(_get_text(tp, ["tcx:HeartRateBpm/tcx:Value"]))
-                    cad  = _to_int(_get_text(tp, ["tcx:Cadence"]))
-
-                    # Extensiones comunes (ns3 primero, luego ns2 por compatibilidad)
-                    speed_mps = _to_float(_get_text(tp, [
-                        "tcx:Extensions/ns3:TPX/ns3:Speed",
-                        "tcx:Extensions/ns2:TPX/ns2:Speed",
-                    ]))
-                    watts = _to_float(_get_text(tp, [
-                        "tcx:Extensions/ns3:TPX/ns3:Watts",
-                        "tcx:Extensions/ns2:TPX/ns2:Watts",
-                    ]))
-                    run_spm = _to_int(_get_text(tp, [
-                        "tcx:Extensions/ns3:TPX/ns3:RunCadence",
-                        "tcx:Extensions/ns2:TPX/ns2:RunCadence",
-                    ]))
-                    if cad is None:
-                        cad = _to_int(_get_text(tp, [
-                            "tcx:Extensions/ns3:TPX/ns3:Cadence",
-                            "tcx:Extensions/ns2:TPX/ns2:Cadence",
-                        ]))
-
-                    speed_kmh = speed_mps * 3.6 if speed_mps is not None else None
-
-                    rows.append({
-                        "activity_sport": sport,
-                        "lap_index": li,
-                        "trackpoint_index": ti,
-                        "time_utc": ts.isoformat() if ts else None,
-                        "elapsed_s": round(elapsed, 3) if elapsed is not None else None,
-                        "latitude_deg": lat,
-                        "longitude_deg": lon,
-                        "altitude_m": alt,
-                        "distance_m": dist,
-                        "speed_mps": speed_mps,
-                        "speed_kmh": round(speed_kmh, 3) if speed_kmh is not None else None,
-                        "hr_bpm": hr,
-                        "cadence_rpm": cad,
-                        "run_cadence_spm": run_spm,
-                        "power_w": watts,
-                    })
+        act_rows, first_ts = _activity_to_rows(act, first_ts)
+        rows.extend(act_rows)
     return rows
 
 
+def parse_tcx_source_to_rows(
+    source: str | os.PathLike | bytes, name: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Parsea un .tcx/.tcx.gz dado como ruta o como bytes (p. ej. el cuerpo de una
+    petición HTTP). 'name' decide si hay que descomprimir (.gz); con una ruta,
+    por defecto es la propia ruta.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return parse_tcx_stream_to_rows(_open_maybe_gzip_stream(BytesIO(source), name or ""))
+    path = os.fspath(source)
+    with open(path, "rb") as fh:
+        return parse_tcx_stream_to_rows(_open_maybe_gzip_stream(fh, name or path))
+
+
+def _activity_to_rows(
+    act: ET.Element,
+    first_ts: Optional[datetime] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[datetime]]:
+    """
+    Convierte un nodo Activity en filas (una por Trackpoint).
+    'first_ts' es la base de elapsed_s; si es None se toma el primer timestamp
+    de la actividad. Devuelve (filas, first_ts) para encadenar actividades.
+    """
+    rows: List[Dict[str, Any]] = []
+    sport = act.get("Sport")
+    for li, lap in enumerate(act.findall("tcx:Lap", NS), start=1):
+        for track in lap.findall("tcx:Track", NS):
+            for ti, tp in enumerate(track.findall("tcx:Trackpoint", NS), start=1):
+                # Tiempo
+                ts_txt = _get_text(tp, ["tcx:Time"])
+                ts = _parse_iso8601_z(ts_txt) if ts_txt else None
+                if ts and first_ts is None:
+                    first_ts = ts
+                elapsed = (ts - first_ts).total_seconds() if (ts and first_ts) else None
+
+                # Posición / métricas básicas
+                lat = _to_float(_get_text(tp, ["tcx:Position/tcx:LatitudeDegrees"]))
+                lon = _to_float(_get_text(tp, ["tcx:Position/tcx:LongitudeDegrees"]))
+                alt = _to_float(_get_text(tp, ["tcx:AltitudeMeters"]))
+                dist = _to_float(_get_text(tp, ["tcx:DistanceMeters"]))
+                hr   = _to_int(_get_text(tp, ["tcx:HeartRateBpm/tcx:Value"]))
+                cad  = _to_int(_get_text(tp, ["tcx:Cadence"]))
+
+                # Extensiones comunes (ns3 primero, luego ns2 por compatibilidad)
+                speed_mps = _to_float(_get_text(tp, [
+                    "tcx:Extensions/ns3:TPX/ns3:Speed",
+                    "tcx:Extensions/ns2:TPX/ns2:Speed",
+                ]))
+                watts = _to_float(_get_text(tp, [
+                    "tcx:Extensions/ns3:TPX/ns3:Watts",
+                    "tcx:Extensions/ns2:TPX/ns2:Watts",
+                ]))
+                run_spm = _to_int(_get_text(tp, [
+                    "tcx:Extensions/ns3:TPX/ns3:RunCadence",
+                    "tcx:Extensions/ns2:TPX/ns2:RunCadence",
+                ]))
+                if cad is None:
+                    cad = _to_int(_get_text(tp, [
+                        "tcx:Extensions/ns3:TPX/ns3:Cadence",
+                        "tcx:Extensions/ns2:TPX/ns2:Cadence",
+                    ]))
+
+                speed_kmh = speed_mps * 3.6 if speed_mps is not None else None
+
+                rows.append({
+                    "activity_sport": sport,
+                    "lap_index": li,
+                    "trackpoint_index": ti,
+                    "time_utc": ts.isoformat() if ts else None,
+                    "elapsed_s": round(elapsed, 3) if elapsed is not None else None,
+                    "latitude_deg": lat,
+                    "longitude_deg": lon,
+                    "altitude_m": alt,
+                    "distance_m": dist,
+                    "speed_mps": speed_mps,
+                    "speed_kmh": round(speed_kmh, 3) if speed_kmh is not None else None,
+                    "hr_bpm": hr,
+                    "cadence_rpm": cad,
+                    "run_cadence_spm": run_spm,
+                    "power_w": watts,
+                })
+    return rows, first_ts
+
+
+# ---------- Modo multi-actividad (streaming) ----------
+
+_ACTIVITIES_TAG = f"{{{NS['tcx']}}}Activities"
+_ACTIVITY_TAG = f"{{{NS['tcx']}}}Activity"
+_ID_TAG = f"{{{NS['tcx']}}}Id"
+
+
+def iter_tcx_stream_activities(stream: BinaryIO) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Recorre un TCX (p. ej. un export de historial con cientos de actividades) con
+    iterparse y produce (id_actividad, filas) por cada Activity, cada una con su
+    propia base de elapsed_s. Cada nodo se libera al terminar, así que solo hay
+    una actividad residente en memoria a la vez.
+    """
+    parent: Optional[ET.Element] = None
+    n = 0
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if elem.tag == _ACTIVITIES_TAG:
+                parent = elem
+            continue
+        if elem.tag != _ACTIVITY_TAG:
+            continue
+        n += 1
+        act_id = (elem.findtext(_ID_TAG) or "").strip() or f"actividad_{n}"
+        rows, _ = _activity_to_rows(elem)
+        elem.clear()
+        if parent is not None:
+            parent.remove(elem)
+        yield act_id, rows
+
+
+def iter_tcx_activities(uploaded_file) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Versión de iter_tcx_stream_activities para un archivo subido (.tcx/.tcx.gz)."""
+    yield from iter_tcx_stream_activities(_open_maybe_gzip_bytes(uploaded_file))
+
+
+# ---------- Archivos ZIP (lotes de actividades) ----------
+
+def iter_zip_tcx_members(zf: zipfile.ZipFile) -> Iterator[zipfile.ZipInfo]:
+    """
+    Recorre los miembros .tcx/.tcx.gz de un ZIP (ignora carpetas y metadatos de macOS).
+    """
+    for info in zf.infolist():
+        if info.is_dir():
+            continue
+        name = info.filename
+        if name.startswith("__MACOSX/") or os.path.basename(name).startswith("._"):
+            continue
+        if is_tcx_name(name):
+            yield info
+
+
+def _parse_member_bytes(item: Tuple[str, bytes]) -> List[Dict[str, Any]]:
+    # Se ejecuta en un proceso del pool: recibe (nombre, bytes) picklables en vez
+    # del ZipFile compartido. El .gz interno se descomprime al vuelo.
+    name, data = item
+    return parse_tcx_source_to_rows(data, name)
+
+
+def _read_zip_members(zf: zipfile.ZipFile) -> Iterator[Tuple[str, bytes]]:
+    # Generador perezoso: bounded_parallel_map solo lee un miembro nuevo cuando
+    # hay hueco, así que en memoria hay como mucho 'max_workers' miembros.
+    for info in iter_zip_tcx_members(zf):
+        yield info.filename, zf.read(info)
+
+
+def _map_zip_members(zip_source, fn, max_workers: int) -> Iterator[Tuple[str, Any]]:
+    if hasattr(zip_source, "seek"):
+        zip_source.seek(0)
+    with zipfile.ZipFile(zip_source, "r") as zf:
+        results = bounded_parallel_map(fn, _read_zip_members(zf), max_workers=max_workers, processes=True)
+        for (name, _data), result in results:
+            yield name, result
+
+
+def parse_zip_to_rows(
+    zip_source,
+    max_workers: int = ZIP_MAX_WORKERS,
+) -> Iterator[Tuple[str, List[Dict[str, Any]] | Exception]]:
+    """
+    Parsea en paralelo los TCX contenidos en un ZIP y produce (nombre_miembro, filas)
+    en el orden del archivo. 'zip_source' puede ser una ruta o un archivo binario
+    seekable (p. ej. el UploadedFile de Streamlit), que no se copia a memoria.
+
+    El parseo XML retiene el GIL, así que se reparte en un pool de procesos: el
+    proceso principal lee los bytes (comprimidos) de cada miembro y los envía a
+    un worker. Solo hay como máximo 'max_workers' miembros en vuelo, de modo que
+    la memoria pico depende de ese número y no del tamaño del ZIP. Si un miembro
+    falla, se produce la excepción en lugar de las filas para que el llamador decida.
+    """
+    yield from _map_zip_members(zip_source, _parse_member_bytes, max_workers)
+
+
+def iter_zip_tcx_activities(zip_source) -> Iterator[Tuple[str, int, str, List[Dict[str, Any]] | Exception]]:
+    """
+    Como parse_zip_to_rows, pero separa cada Activity de cada miembro (exports
+    multi-actividad dentro del ZIP), cada una con su propia base de elapsed_s.
+    Produce (nombre_miembro, n, id_actividad, filas) con n = 1, 2, ... por miembro.
+    Si un miembro falla, produce (nombre_miembro, 0, "", excepción).
+
+    Cada miembro se recorre como stream con iterparse en este proceso, así que
+    solo hay una actividad residente a la vez aunque el miembro sea un historial
+    con cientos; el trabajo pesado (métricas/XLSX) lo reparte process_activities.
+    """
+    if hasattr(zip_source, "seek"):
+        zip_source.seek(0)
+    with zipfile.ZipFile(zip_source, "r") as zf:
+        for info in iter_zip_tcx_members(zf):
+            try:
+                with zf.open(info, "r") as member:
+                    stream = _open_maybe_gzip_stream(member, info.filename)
+                    for n, (act_id, rows) in enumerate(iter_tcx_stream_activities(stream), start=1):
+                        yield info.filename, n, act_id, rows
+            except Exception as e:
+                yield info.filename, 0, "", e
+
+
 # ---------- Conversión a DataFrame ----------
 
 def rows_to_dataframe(rows: List[Dict[str, Any]]) -> pd.DataFrame:
@@ -0,0 +1,288 @@
+# =========================
+# made4try/kernels.py — Kernels numéricos (NumPy / Numba opcional)
+# =========================
+"""
+Capa de kernels para los bucles numéricos calientes:
+
+  - window_scan:            barrido de ventanas por tiempo (find_best_window_timebased)
+  - rolling_time_mean:      media móvil por tiempo real (ventana (t-w, t])
+  - decimate_minmax_indices: diezmado min/max para gráficas
+  - segment_ids:            detección de huecos/pausas en elapsed_s
+
+Cada kernel tiene una versión NumPy (siempre disponible) y, si Numba está
+instalado, una versión JIT con los mismos pasos aritméticos (resultados
+idénticos). La compilación se cachea en disco (cache=True) y solo ocurre en el
+primer uso, no al importar.
+
+Backend: variable de entorno MADE4TRY_KERNELS = auto | numpy | numba, o set_backend().
+"""
+from __future__ import annotations
+
+import os
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+try:  # dependencia opcional
+    import numba
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - depende del entorno
+    numba = None
+    HAVE_NUMBA = False
+
+_BACKENDS = ("auto", "numpy", "numba")
+_backend = os.environ.get("MADE4TRY_KERNELS", "auto").lower()
+if _backend not in _BACKENDS:
+    _backend = "auto"
+
+
+def get_backend() -> str:
+    """Backend efectivo: 'numba' si está pedido/disponible, si no 'numpy'."""
+    if _backend == "numpy" or not HAVE_NUMBA:
+        return "numpy"
+    return "numba"
+
+
+def set_backend(name: str) -> None:
+    """Fija el backend ('auto', 'numpy' o 'numba'). 'numba' exige Numba instalado."""
+    global _backend
+    name = name.lower()
+    if name not in _BACKENDS:
+        raise ValueError(f"backend desconocido: {name!r} (usa {', '.join(_BACKENDS)})")
+    if name == "numba" and not HAVE_NUMBA:
+        raise ImportError("el backend 'numba' requiere numba instalado")
+    _backend = name
+
+
+# ---------- Implementaciones NumPy ----------
+
+def _prefix(a: np.ndarray) -> np.ndarray:
+    out = np.zeros(len(a) + 1)
+    np.cumsum(a, out=out[1:])
+    return out
+
+
+def _window_scan_numpy(el, w, x, hr_ok, window_secs):
+    n = len(el)
+    valid = np.isfinite(x) & (w > 0)
+    wv = np.where(valid, w, 0.0)
+    xv = np.where(valid, x, 0.0)
+    sw, swx, swx2 = _prefix(wv), _prefix(wv * xv), _prefix(wv * xv * xv)
+    cnt, chr_ = _prefix(valid.astype(np.float64)), _prefix(hr_ok.astype(np.float64))
+
+    i = np.arange(n)
+    j = np.searchsorted(el, el + window_secs, side="left")
+    W = sw[j] - sw[i]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg = np.where(W > 0, (swx[j] - swx[i]) / W, np.nan)
+        var = (swx2[j] - swx2[i]) / W - avg * avg
+        sd = np.sqrt(np.maximum(var, 0.0))
+        cv = np.where((cnt[j] - cnt[i] >= 3) & np.isfinite(avg) & (avg != 0), sd / avg, np.nan)
+        hr_cov = (chr_[j] - chr_[i]) / (j - i)
+    return j, avg, cv, hr_cov
+
+
+def _rolling_time_mean_numpy(el, x, window_secs):
+    valid = np.isfinite(x)
+    s, c = _prefix(np.where(valid, x, 0.0)), _prefix(valid.astype(np.float64))
+    hi = np.arange(1, len(el) + 1)
+    lo = np.searchsorted(el, el - window_secs, side="right")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = c[hi] - c[lo]
+        return np.where(k > 0, (s[hi] - s[lo]) / k, np.nan)
+
+
+def _decimate_minmax_numpy(y, max_points):
+    n = len(y)
+    n_buckets = max(1, max_points // 2)
+    size = -(-n // n_buckets)  # ceil
+    pad = n_buckets * size - n
+    yp = np.concatenate([y, np.full(pad, np.nan)]).reshape(n_buckets, size)
+    all_nan = np.isnan(yp).all(axis=1)
+    lo = np.argmin(np.where(np.isnan(yp), np.inf, yp), axis=1)
+    hi = np.argmax(np.where(np.isnan(yp), -np.inf, yp), axis=1)
+    base = np.arange(n_buckets) * size
+    idx = np.concatenate([base + lo, base + hi, base[all_nan], np.array([0, n - 1])])
+    return np.unique(idx[idx < n])
+
+
+def _segment_ids_numpy(el, gap_s):
+    d = np.diff(el, prepend=np.nan)
+    return np.cumsum(d > gap_s).astype(np.int64)
+
+
+# ---------- Implementaciones Numba (mismos pasos aritméticos) ----------
+
+def _prefix_loop(a):
+    out = np.zeros(len(a) + 1)
+    acc = 0.0
+    for k in range(len(a)):
+        acc += a[k]
+        out[k + 1] = acc
+    return out
+
+
+def _window_scan_loop(el, w, x, hr_ok, window_secs):
+    n = len(el)
+    wv = np.zeros(n)
+    wx = np.zeros(n)
+    wx2 = np.zeros(n)
+    vv = np.zeros(n)
+    hh = np.zeros(n)
+    for k in range(n):
+        if np.isfinite(x[k]) and w[k] > 0:
+            wv[k] = w[k]
+            wx[k] = w[k] * x[k]
+            wx2[k] = w[k] * x[k] * x[k]
+            vv[k] = 1.0
+        if hr_ok[k]:
+            hh[k] = 1.0
+    sw, swx, swx2 = _prefix_loop(wv), _prefix_loop(wx), _prefix_loop(wx2)
+    cnt, chr_ = _prefix_loop(vv), _prefix_loop(hh)
+
+    j_out = np.empty(n, dtype=np.int64)
+    avg = np.full(n, np.nan)
+    cv = np.full(n, np.nan)
+    hr_cov = np.full(n, np.nan)
+    j = 0
+    for i in range(n):
+        # dos punteros: j = primer índice con el[j] >= el[i] + window
+        if j < i:
+            j = i
+        t1 = el[i] + window_secs
+        while j < n and el[j] < t1:
+            j += 1
+        j_out[i] = j
+        W = sw[j] - sw[i]
+        if W > 0:
+            a = (swx[j] - swx[i]) / W
+            avg[i] = a
+            if cnt[j] - cnt[i] >= 3 and np.isfinite(a) and a != 0:
+                var = (swx2[j] - swx2[i]) / W - a * a
+                cv[i] = np.sqrt(max(var, 0.0)) / a
+        if j > i:
+            hr_cov[i] = (chr_[j] - chr_[i]) / (j - i)
+    return j_out, avg, cv, hr_cov
+
+
+def _rolling_time_mean_loop(el, x, window_secs):
+    n = len(el)
+    s = np.zeros(n + 1)
+    c = np.zeros(n + 1)
+    for k in range(n):
+        ok = np.isfinite(x[k])
+        s[k + 1] = s[k] + (x[k] if ok else 0.0)
+        c[k + 1] = c[k] + (1.0 if ok else 0.0)
+    out = np.full(n, np.nan)
+    lo = 0
+    for i in range(n):
+        # lo = primer índice con el[lo] > el[i] - window
+        t0 = el[i] - window_secs
+        while lo < i and el[lo] <= t0:
+            lo += 1
+        k = c[i + 1] - c[lo]
+        if k > 0:
+            out[i] = (s[i + 1] - s[lo]) / k
+    return out
+
+
+def _decimate_minmax_loop(y, max_points):
+    n = len(y)
+    n_buckets = max(1, max_points // 2)
+    size = -(-n // n_buckets)
+    keep = np.zeros(n, dtype=np.bool_)
+    keep[0] = True
+    keep[n - 1] = True
+    for b in range(n_buckets):
+        start = b * size
+        if start >= n:
+            continue
+        stop = min(start + size, n)
+        lo_i, hi_i = -1, -1
+        for k in range(start, stop):
+            v = y[k]
+            if np.isnan(v):
+                continue
+            if lo_i < 0 or v < y[lo_i]:
+                lo_i = k
+            if hi_i < 0 or v > y[hi_i]:
+                hi_i = k
+        if lo_i < 0:  # cubeta sin datos: se conserva su primera muestra
+            keep[start] = True
+        else:
+            keep[lo_i] = True
+            keep[hi_i] = True
+    return np.nonzero(keep)[0]
+
+
+def _segment_ids_loop(el, gap_s):
+    n = len(el)
+    out = np.zeros(n, dtype=np.int64)
+    seg = 0
+    for k in range(1, n):
+        if el[k] - el[k - 1] > gap_s:
+            seg += 1
+        out[k] = seg
+    return out
+
+
+_NUMPY: Dict[str, Callable] = {
+    "window_scan": _window_scan_numpy,
+    "rolling_time_mean": _rolling_time_mean_numpy,
+    "decimate_minmax": _decimate_minmax_numpy,
+    "segment_ids": _segment_ids_numpy,
+}
+
+_NUMBA: Dict[str, Callable] = {}
+if HAVE_NUMBA:
+    # njit es perezoso: compila en la primera llamada y guarda el resultado en disco
+    _njit = numba.njit(cache=True)
+    _prefix_loop = _njit(_prefix_loop)
+    _NUMBA = {
+        "window_scan": _njit(_window_scan_loop),
+        "rolling_time_mean": _njit(_rolling_time_mean_loop),
+        "decimate_minmax": _njit(_decimate_minmax_loop),
+        "segment_ids": _njit(_segment_ids_loop),
+    }
+
+
+def _impl(name: str) -> Callable:
+    return _NUMBA[name] if get_backend() == "numba" else _NUMPY[name]
+
+
+# ---------- API pública ----------
+
+def window_scan(
+    el: np.ndarray, w: np.ndarray, x: np.ndarray, hr_ok: np.ndarray, window_secs: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Para cada inicio i (el ordenado): j = primer índice con el[j] >= el[i] + window,
+    media ponderada por w de x válida en [i, j), su CV ponderado (NaN con < 3
+    muestras válidas o media 0) y la fracción de muestras con hr_ok.
+    """
+    return _impl("window_scan")(
+        np.ascontiguousarray(el, dtype=np.float64), np.ascontiguousarray(w, dtype=np.float64),
+        np.ascontiguousarray(x, dtype=np.float64), np.ascontiguousarray(hr_ok, dtype=np.bool_),
+        float(window_secs),
+    )
+
+
+def rolling_time_mean(el: np.ndarray, x: np.ndarray, window_secs: float) -> np.ndarray:
+    """Media de x válida en la ventana (el[i] - window, el[i]] (el ordenado)."""
+    return _impl("rolling_time_mean")(
+        np.ascontiguousarray(el, dtype=np.float64), np.ascontiguousarray(x, dtype=np.float64),
+        float(window_secs),
+    )
+
+
+def decimate_minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Índices ordenados: min y max por cubeta + primera y última muestra."""
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    if len(y) <= max(2, int(max_points)):
+        return np.arange(len(y))
+    return _impl("decimate_minmax")(y, int(max_points)).astype(np.int64)
+
+
+def segment_ids(el: np.ndarray, gap_s: float) -> np.ndarray:
+    """Id de segmento por muestra: +1 cada vez que el salto de el supera gap_s."""
+    return _impl("segment_ids")(np.ascontiguousarray(el, dtype=np.float64), float(gap_s))
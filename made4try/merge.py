@@ -0,0 +1,192 @@
+# =========================
+# made4try/merge.py — Fusión de varias grabaciones de una misma sesión
+# =========================
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .config import (
+    MERGE_TOLERANCE_S, MERGE_MAX_OFFSET_S, MERGE_MIN_OVERLAP_S, MERGE_MIN_CORR, MERGE_MIN_GAIN,
+)
+
+# Columnas de señal que pueden venir de cualquier fuente
+SIGNAL_COLUMNS = [
+    "latitude_deg", "longitude_deg", "altitude_m", "distance_m",
+    "speed_mps", "speed_kmh", "hr_bpm", "cadence_rpm", "run_cadence_spm", "power_w",
+]
+
+# Señales compartidas útiles para estimar el desfase de reloj entre equipos
+SYNC_COLUMNS = ["hr_bpm", "power_w", "speed_mps", "cadence_rpm", "altitude_m"]
+
+# Columnas donde 0 equivale a "sin dato" (sensor desconectado)
+_ZERO_IS_MISSING = {"hr_bpm", "power_w", "cadence_rpm", "run_cadence_spm"}
+
+
+def _valid(s: pd.Series, col: str) -> pd.Series:
+    s = pd.to_numeric(s, errors="coerce")
+    return s.notna() & (s > 0) if col in _ZERO_IS_MISSING else s.notna()
+
+
+def _coverage(df: pd.DataFrame, col: str) -> float:
+    if col not in df.columns or not len(df):
+        return 0.0
+    return float(_valid(df[col], col).mean())
+
+
+def _epoch_seconds(t: pd.Series) -> np.ndarray:
+    return (pd.to_datetime(t) - pd.Timestamp(0)).dt.total_seconds().to_numpy(dtype=float)
+
+
+def _to_1hz(sec: np.ndarray, values: np.ndarray, t0: int, n: int) -> np.ndarray:
+    """Rejilla de 1 Hz (NaN donde no hay muestra) a partir de tiempos ordenados."""
+    grid = np.full(n, np.nan)
+    idx = np.floor(sec).astype(np.int64) - t0
+    ok = (idx >= 0) & (idx < n) & np.isfinite(values)
+    grid[idx[ok]] = values[ok]
+    return grid
+
+
+def _fft_xcorr(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Correlación cruzada completa vía FFT: c[k] = Σ_t a[t+k]·b[t], k ∈ [-(len(b)-1), len(a)-1].
+    Se devuelve ordenada por k creciente.
+    """
+    n = len(a) + len(b) - 1
+    nfft = 1 << (n - 1).bit_length()
+    c = np.fft.irfft(np.fft.rfft(a, nfft) * np.conj(np.fft.rfft(b, nfft)), nfft)
+    return np.concatenate([c[nfft - (len(b) - 1):], c[:len(a)]])
+
+
+def estimate_clock_offset(
+    ref: pd.DataFrame,
+    other: pd.DataFrame,
+    columns: Sequence[str] = SYNC_COLUMNS,
+    max_offset_s: float = MERGE_MAX_OFFSET_S,
+    min_overlap_s: float = MERGE_MIN_OVERLAP_S,
+    min_corr: float = MERGE_MIN_CORR,
+    min_gain: float = MERGE_MIN_GAIN,
+) -> float:
+    """
+    Estima el desfase de reloj (s) de 'other' respecto a 'ref' por correlación
+    cruzada (FFT, O(n log n)) de las señales compartidas llevadas a 1 Hz y
+    normalizadas. Solo se consideran desfases con |d| <= max_offset_s y con al
+    menos min_overlap_s segundos de solape válido.
+    Devuelve d tal que t_ref ≈ t_other - d.
+
+    Devuelve 0.0 si no hay señales comunes con variación (p. ej. altitud constante
+    en rodillo), si el pico no alcanza min_corr o si no supera al desfase 0 en al
+    menos min_gain: sin evidencia clara se asume que los relojes ya coinciden.
+    Entre desfases empatados gana el de menor |d|.
+    """
+    shared = [c for c in columns if _coverage(ref, c) > 0 and _coverage(other, c) > 0]
+    if not shared:
+        return 0.0
+
+    sa, sb = _epoch_seconds(ref["time_utc"]), _epoch_seconds(other["time_utc"])
+    a0, b0 = int(np.floor(sa[0])), int(np.floor(sb[0]))
+    na, nb = int(sa[-1]) - a0 + 1, int(sb[-1]) - b0 + 1
+
+    score = np.zeros(na + nb - 1)
+    overlap = np.zeros(na + nb - 1)
+    used = 0
+    for col in shared:
+        ga = _to_1hz(sa, pd.to_numeric(ref[col], errors="coerce").where(_valid(ref[col], col)).to_numpy(float), a0, na)
+        gb = _to_1hz(sb, pd.to_numeric(other[col], errors="coerce").where(_valid(other[col], col)).to_numpy(float), b0, nb)
+        sda, sdb = np.nanstd(ga), np.nanstd(gb)
+        if not (sda > 0 and sdb > 0):
+            continue  # señal plana: no aporta información sobre el desfase
+        ma, mb = np.isfinite(ga), np.isfinite(gb)
+        score += _fft_xcorr(np.where(ma, (ga - np.nanmean(ga)) / sda, 0.0),
+                            np.where(mb, (gb - np.nanmean(gb)) / sdb, 0.0))
+        overlap += _fft_xcorr(ma.astype(float), mb.astype(float))
+        used += 1
+    if not used:
+        return 0.0
+
+    # k = desplazamiento en la rejilla; d = b0 - a0 - k
+    k = np.arange(-(nb - 1), na)
+    d = (b0 - a0) - k
+    ok = (np.abs(d) <= max_offset_s) & (np.rint(overlap) >= min_overlap_s * used)
+    if not ok.any():
+        return 0.0
+    norm = np.where(ok, score / np.maximum(overlap, 1.0), -np.inf)
+    peak = norm.max()
+    if peak < min_corr:
+        return 0.0
+    zero = norm[d == 0]
+    if zero.size and np.isfinite(zero[0]) and peak - zero[0] < min_gain:
+        return 0.0
+    # empates (p. ej. señal periódica): el desfase de menor |d|
+    ties = np.flatnonzero(norm >= peak - 1e-9)
+    return float(d[ties[np.argmin(np.abs(d[ties]))]])
+
+
+def merge_recordings(
+    frames: Sequence[pd.DataFrame],
+    *,
+    tolerance_s: float = MERGE_TOLERANCE_S,
+    max_offset_s: float = MERGE_MAX_OFFSET_S,
+    estimate_offsets: bool = True,
+) -> pd.DataFrame:
+    """
+    Fusiona varias grabaciones de la misma sesión (p. ej. potencia del ciclocomputador
+    y FC del reloj) en un solo DataFrame con el esquema de rows_to_dataframe.
+
+      - La referencia es la grabación con más muestras con tiempo válido; su eje
+        time_utc es el de la salida.
+      - Cada otra grabación se corrige por su desfase de reloj (estimate_clock_offset)
+        y se alinea con un as-of join ordenado al vecino más cercano dentro de
+        'tolerance_s' (lineal sobre datos ordenados).
+      - Para cada columna de señal se elige la fuente con mejor cobertura.
+
+    En df.attrs quedan 'merge_sources' (columna → índice de la fuente elegida)
+    y 'clock_offsets_s' (desfase aplicado a cada fuente).
+    """
+    clean: List[pd.DataFrame] = []
+    for f in frames:
+        g = f[f["time_utc"].notna()].sort_values("time_utc", kind="mergesort")
+        clean.append(g.drop_duplicates("time_utc", keep="last").reset_index(drop=True))
+    if not clean:
+        raise ValueError("merge_recordings necesita al menos una grabación")
+
+    ref_i = int(np.argmax([len(g) for g in clean]))
+    ref = clean[ref_i]
+    out = ref.drop(columns=[c for c in SIGNAL_COLUMNS if c in ref.columns])
+
+    offsets: List[float] = [0.0] * len(clean)
+    aligned: List[Optional[pd.DataFrame]] = [None] * len(clean)
+    aligned[ref_i] = ref
+    tol = pd.Timedelta(seconds=float(tolerance_s))
+    for i, g in enumerate(clean):
+        if i == ref_i or g.empty:
+            continue
+        if estimate_offsets and not ref.empty:
+            offsets[i] = estimate_clock_offset(ref, g, max_offset_s=max_offset_s)
+        cols = [c for c in SIGNAL_COLUMNS if c in g.columns]
+        g = g[["time_utc"] + cols].assign(time_utc=g["time_utc"] - pd.Timedelta(seconds=offsets[i]))
+        aligned[i] = pd.merge_asof(
+            ref[["time_utc"]], g, on="time_utc", direction="nearest", tolerance=tol
+        )
+
+    # Mejor fuente por columna (empate → la referencia, luego el orden de entrada)
+    sources: Dict[str, int] = {}
+    order = [ref_i] + [i for i in range(len(clean)) if i != ref_i]
+    for col in SIGNAL_COLUMNS:
+        cands = [i for i in order if aligned[i] is not None and col in aligned[i].columns]
+        if not cands:
+            continue
+        best = max(cands, key=lambda i: (_coverage(aligned[i], col), -order.index(i)))
+        sources[col] = best
+        out[col] = aligned[best][col].to_numpy()
+
+    # Base de tiempo común
+    t = out["time_utc"]
+    out["elapsed_s"] = (t - t.iloc[0]).dt.total_seconds().round(3) if len(out) else np.nan
+    out = out[[c for c in frames[ref_i].columns if c in out.columns]
+              + [c for c in out.columns if c not in frames[ref_i].columns]]
+    out.attrs["merge_sources"] = sources
+    out.attrs["clock_offsets_s"] = offsets
+    return out
@@ -1,4 +1,16 @@
+# =========================
+# made4try/metrics.py
+# =========================
+from __future__ import annotations
+
 import numpy as np
+import pandas as pd
+
+from . import kernels
+from .config import (
+    ROLLING_WINDOW_SECONDS, DISPLAY_SMOOTH_SECONDS, HR_FILL_MA_SECONDS, BEST_WINDOW_SECONDS,
+    POWER_ZONE_EDGES_PCT, HR_ZONE_EDGES_PCT,
+)
 
 def _weighted_mean(x: pd.Series, w: pd.Series) -> float:
     x = pd.to_numeric(x, errors="coerce")
@@ -113,56 +125,322 @@ def find_best_window_timebased(
 
     best = {"ok": False, "score": -float("inf")}
 
-    # Two-pointer scan
-    i = 0
+    # Barrido de ventanas (dos punteros) en la capa de kernels: por cada inicio i,
+    # fin j, media ponderada, CV y cobertura de FC de la ventana [i, j)
     n = len(m)
-    while i < n:
-        t0 = float(el.iloc[i])
-        t1 = t0 + float(window_secs)
-
-        # mover j hasta cubrir ventana
-        j = i
-        while j < n and float(el.iloc[j]) < t1:
-            j += 1
-        if j >= n:
-            break
-
-        seg = m.iloc[i:j].copy()
-        if len(seg) < 5:
-            i += 1
+    el_a = el.ffill().fillna(0.0).to_numpy()
+    w = pd.to_numeric(dt_s.reindex(m.index), errors="coerce").astype(float).clip(lower=0.0).fillna(0.0)
+    x = pd.to_numeric(intensity_series.reindex(m.index), errors="coerce").astype(float)
+    if hr_raw is not None:
+        hr = pd.to_numeric(hr_raw.reindex(m.index), errors="coerce")
+        hr_ok = (hr.notna() & (hr > 0)).to_numpy()
+    else:
+        hr_ok = np.zeros(n, dtype=bool)
+    j, avg_int, cv_int, hr_cov = kernels.window_scan(el_a, w.to_numpy(), x.to_numpy(), hr_ok, window_secs)
+
+    # ventanas completas (la ventana debe cerrarse antes del final) con >= 5 muestras
+    i = np.arange(n)
+    ok = (j < n) & (j - i >= 5) & np.isfinite(avg_int)
+    if mode == "decoupling_valid":
+        ok &= hr_cov >= min_hr_cov_window
+        ok &= ~(np.isfinite(cv_int) & (cv_int > max_cv_intensity))
+
+    # score según criterio ('max_avg_if' / 'max_avg_speed': media ponderada)
+    score = avg_int
+    if not ok.any():
+        return best
+    b = int(np.argmax(np.where(ok, score, -np.inf)))
+    return {
+        "ok": True,
+        "start_s": float(el_a[b]),
+        "end_s": float(el_a[j[b] - 1]),
+        "score": float(score[b]),
+        "cv_intensity": float(cv_int[b]) if np.isfinite(cv_int[b]) else float("nan"),
+        "hr_cov_window": float(hr_cov[b]) if mode == "decoupling_valid" else None,
+    }
+
+
+# ---------- Métricas mínimas de carga (TSS/FSS) ----------
+
+# Separación artificial entre segmentos en el eje de las ventanas (> cualquier ventana)
+_SEGMENT_AXIS_SEP_S = 86400.0
+
+def _num(df: pd.DataFrame, col: str) -> pd.Series:
+    """Columna numérica float (NaN si no existe o no se puede convertir)."""
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index, dtype=float)
+    return pd.to_numeric(df[col], errors="coerce").astype(float)
+
+
+def _window_axis(df: pd.DataFrame) -> pd.Series:
+    """
+    Eje de tiempo para ventanas móviles: elapsed_s, con los segmentos (si hay
+    segment_id) separados artificialmente para que ninguna ventana los cruce.
+    """
+    el = _num(df, "elapsed_s")
+    if "segment_id" in df.columns:
+        seg = pd.to_numeric(df["segment_id"], errors="coerce").fillna(0.0)
+        el = el + seg * _SEGMENT_AXIS_SEP_S
+    return el
+
+
+def _rolling_time_mean(x: pd.Series, el: pd.Series, secs: float) -> pd.Series:
+    """
+    Media móvil por tiempo real (ventana (t-secs, t]) usando elapsed_s como eje.
+    Ignora NaN; si el eje no es monótono, cae a una ventana por número de muestras.
+    """
+    secs = max(1, int(secs))
+    axis = el.ffill().fillna(0.0)
+    if not axis.is_monotonic_increasing:
+        return x.rolling(secs, min_periods=1).mean()
+    out = kernels.rolling_time_mean(axis.to_numpy(dtype=float), x.to_numpy(dtype=float), secs)
+    return pd.Series(out, index=x.index)
+
+def _hr_valid_and_filled(hr_raw: pd.Series, axis: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """FC válida (>0) y FC rellenada con su MA de HR_FILL_MA_SECONDS (la que usa FSS)."""
+    hr_valid = hr_raw.where(hr_raw > 0)
+    return hr_valid, hr_valid.fillna(_rolling_time_mean(hr_valid, axis, HR_FILL_MA_SECONDS))
+
+
+def _zone_index(pct: pd.Series, edges: list) -> np.ndarray:
+    """Zona 1..len(edges)+1 por muestra con np.digitize (0 = sin dato)."""
+    x = pct.to_numpy(dtype=float)
+    z = np.digitize(x, edges) + 1
+    z[~np.isfinite(x)] = 0
+    return z.astype(np.int8)
+
+
+def _weighted_power_pack(power: np.ndarray, p30: np.ndarray, w: np.ndarray) -> tuple[float, float, float]:
+    """
+    NP, VI y trabajo (kJ) con los mismos pesos Δt que TSS/FSS y la MA30 ya calculada:
+    NP = (Σ MA30⁴·Δt / ΣΔt)^¼, VI = NP / P̄, kJ = Σ P·Δt / 1000.
+    """
+    ok_p = np.isfinite(power) & (w > 0)
+    ok_30 = np.isfinite(p30) & (w > 0)
+    w_p, w_30 = w[ok_p].sum(), w[ok_30].sum()
+    energy = float((power[ok_p] * w[ok_p]).sum())
+    avg_p = energy / w_p if w_p > 0 else float("nan")
+    np_w = float(((p30[ok_30] ** 4 * w[ok_30]).sum() / w_30) ** 0.25) if w_30 > 0 else float("nan")
+    vi = np_w / avg_p if (np.isfinite(np_w) and avg_p > 0) else float("nan")
+    return np_w, vi, energy / 1000.0
+
+
+def time_in_zones(df: pd.DataFrame) -> dict:
+    """
+    Tiempo (s) por zona de potencia y de FC a partir de power_zone/hr_zone y dt_s
+    (np.bincount ponderado). Devuelve {"power": [...], "hr": [...]} (Z1 primero).
+    """
+    w = _num(df, "dt_s").fillna(0.0).to_numpy()
+    out = {}
+    for key, col, edges in (("power", "power_zone", POWER_ZONE_EDGES_PCT), ("hr", "hr_zone", HR_ZONE_EDGES_PCT)):
+        if col not in df.columns:
+            out[key] = [0.0] * (len(edges) + 1)
             continue
+        z = df[col].to_numpy(dtype=np.int64)
+        out[key] = np.bincount(z, weights=w, minlength=len(edges) + 2)[1:].tolist()
+    return out
+
+
+def add_metrics_minimal(
+    df: pd.DataFrame,
+    base_name: str,
+    ftp: float,
+    fc20: float,
+    smooth_secs: int = DISPLAY_SMOOTH_SECONDS,
+) -> pd.DataFrame:
+    """
+    Añade al DataFrame de trackpoints (opcionalmente limpio, con segment_id)
+    las columnas de carga:
+      - dt_s (Δt por muestra), IF = P/FTP, EFR = FC/FC20, ICR = IF ÷ EFR
+      - TSS_inc = IF²·Δt_h·100, FSS_inc = ICR²·Δt_h·100 (+ MA30, acumulados y totales)
+      - power_smooth/hr_smooth (solo visual) y power_ma30/hr_ma30
+      - NP, VI y work_kJ (totales) y power_zone/hr_zone por muestra, en la misma
+        pasada: comparten la MA30 de potencia y los pesos dt_s de la carga
+    La FC inválida (NaN/<=0) se rellena con su MA de HR_FILL_MA_SECONDS para FSS.
+    No modifica el original.
+    """
+    m = df.copy()
+    el = _num(m, "elapsed_s")
+    power = _num(m, "power_w")
+    hr_raw = _num(m, "hr_bpm")
+
+    dt_s = el.diff().fillna(0.0).clip(lower=0.0)
+    if "segment_id" in m.columns:
+        # Métricas por segmento (ver cleaning.clean_activity): el Δt que cruza una
+        # pausa/hueco no suma carga y las ventanas móviles no mezclan segmentos.
+        seg = pd.to_numeric(m["segment_id"], errors="coerce").fillna(0.0)
+        dt_s = dt_s.where(seg.diff().fillna(0.0) == 0, 0.0)
+    el = _window_axis(m)
+    m["dt_s"] = dt_s
+
+    # FC válida + relleno por MA (afecta FSS)
+    hr_valid, hr_fill = _hr_valid_and_filled(hr_raw, el)
+
+    # Señales visuales y MA30
+    m["power_smooth"] = _rolling_time_mean(power, el, smooth_secs)
+    m["hr_smooth"] = _rolling_time_mean(hr_valid, el, smooth_secs)
+    m["power_ma30"] = _rolling_time_mean(power, el, ROLLING_WINDOW_SECONDS)
+    m["hr_ma30"] = _rolling_time_mean(hr_valid, el, ROLLING_WINDOW_SECONDS)
+
+    # Intensidades relativas
+    intensity = power / float(ftp)
+    efr = hr_fill / float(fc20)
+    icr = intensity / efr.where(efr > 0)
+    m["pct_ftp"] = intensity * 100.0
+    m["pct_fc_rel"] = efr * 100.0
+    m["EFR"] = efr
+    m["IF"] = intensity
+    m["ICR"] = icr
+
+    # Cargas incrementales, acumuladas y totales
+    dt_h = dt_s / 3600.0
+    m["TSS_inc"] = intensity.fillna(0.0) ** 2 * dt_h * 100.0
+    m["FSS_inc"] = icr.fillna(0.0) ** 2 * dt_h * 100.0
+    m["TSS_inc_ma30"] = _rolling_time_mean(m["TSS_inc"], el, ROLLING_WINDOW_SECONDS)
+    m["FSS_inc_ma30"] = _rolling_time_mean(m["FSS_inc"], el, ROLLING_WINDOW_SECONDS)
+    m["TSS"] = m["TSS_inc"].cumsum()
+    m["FSS"] = m["FSS_inc"].cumsum()
+    m["TSS_total"] = float(m["TSS"].iloc[-1]) if len(m) else 0.0
+    m["FSS_total"] = float(m["FSS"].iloc[-1]) if len(m) else 0.0
+
+    # Pack extendido: NP / VI / kJ y zonas (reutiliza MA30 y dt_s)
+    np_w, vi, work_kj = _weighted_power_pack(
+        power.to_numpy(dtype=float), m["power_ma30"].to_numpy(dtype=float), dt_s.to_numpy(dtype=float)
+    )
+    m["NP"] = np_w
+    m["VI"] = vi
+    m["work_kJ"] = work_kj
+    m["power_zone"] = _zone_index(m["pct_ftp"], POWER_ZONE_EDGES_PCT)
+    m["hr_zone"] = _zone_index(hr_valid / float(fc20) * 100.0, HR_ZONE_EDGES_PCT)
+
+    # Identificación del documento
+    fecha = None
+    if "time_utc" in m.columns and m["time_utc"].notna().any():
+        fecha = pd.to_datetime(m["time_utc"]).min().date()
+    m.insert(0, "documento", base_name)
+    m.insert(1, "fecha", fecha)
+    return m
+
+
+# ---------- Sensibilidad a FTP / FC20 ----------
+
+def load_sufficient_stats(df: pd.DataFrame) -> dict:
+    """
+    Estadísticos suficientes de la carga, independientes de FTP y FC20:
+        TSS = S_p2 / FTP²              con S_p2 = Σ P²·Δt_h·100
+        FSS = S_r2 · FC20² / FTP²      con S_r2 = Σ (P / FC_rellena)²·Δt_h·100
+    (IF = P/FTP e ICR = IF ÷ EFR = P·FC20 / (FTP·FC)). Se calculan una vez por
+    actividad (con o sin métricas ya añadidas) y valen para cualquier FTP/FC20.
+    """
+    power = _num(df, "power_w")
+    _, hr_fill = _hr_valid_and_filled(_num(df, "hr_bpm"), _window_axis(df))
+    if "dt_s" in df.columns:
+        dt_s = _num(df, "dt_s").fillna(0.0)
+    else:
+        dt_s = _num(df, "elapsed_s").diff().fillna(0.0).clip(lower=0.0)
+        if "segment_id" in df.columns:
+            dt_s = dt_s.where(_num(df, "segment_id").fillna(0.0).diff().fillna(0.0) == 0, 0.0)
+    dt_h = dt_s.to_numpy(dtype=float) / 3600.0
+
+    p = power.fillna(0.0).to_numpy(dtype=float)
+    ratio = (power / hr_fill.where(hr_fill > 0)).fillna(0.0).to_numpy(dtype=float)
+    return {
+        "sum_p2": float((p ** 2 * dt_h * 100.0).sum()),
+        "sum_r2": float((ratio ** 2 * dt_h * 100.0).sum()),
+    }
+
+
+def sweep_loads(stats: dict, ftps, fc20s) -> pd.DataFrame:
+    """
+    TSS/FSS totales para toda la rejilla FTP × FC20 en una sola operación
+    vectorizada (producto exterior). Devuelve una tabla larga con columnas
+    FTP, FC20, TSS_total y FSS_total.
+    """
+    ftp = np.asarray(ftps, dtype=float).ravel()
+    fc20 = np.asarray(fc20s, dtype=float).ravel()
+    inv_ftp2 = 1.0 / ftp ** 2
+    tss = np.broadcast_to((stats["sum_p2"] * inv_ftp2)[:, None], (len(ftp), len(fc20)))
+    fss = stats["sum_r2"] * np.outer(inv_ftp2, fc20 ** 2)
+    grid_ftp, grid_fc20 = np.meshgrid(ftp, fc20, indexing="ij")
+    return pd.DataFrame({
+        "FTP": grid_ftp.ravel(),
+        "FC20": grid_fc20.ravel(),
+        "TSS_total": tss.ravel(),
+        "FSS_total": fss.ravel(),
+    })
+
+
+def sweep_range(center: float, rel: float, step: float) -> np.ndarray:
+    """
+    Valores alrededor de 'center' (±rel, p. ej. 0.10 = ±10 %) cada 'step', siempre
+    con 'center' incluido (aunque no sea múltiplo de 'step') para que la tabla y
+    el marcador del heatmap coincidan con el valor introducido.
+    """
+    lo = max(step, np.floor(center * (1.0 - rel) / step) * step)
+    hi = np.ceil(center * (1.0 + rel) / step) * step
+    grid = np.round(np.arange(lo, hi + step / 2.0, step), 9)
+    return np.union1d(grid, [float(center)])
+
+
+# ---------- Resumen por actividad ----------
+
+def best_window_mean(x: pd.Series, df: pd.DataFrame, window_secs: float) -> tuple[float, float]:
+    """
+    Mejor media móvil por tiempo de 'window_secs' segundos (solo ventanas completas,
+    sin cruzar segmentos). Devuelve (valor, inicio_s); (nan, nan) si no hay ninguna.
+    """
+    axis = _window_axis(df)
+    if not len(x) or axis.isna().all():
+        return float("nan"), float("nan")
+    roll = _rolling_time_mean(pd.to_numeric(x, errors="coerce").astype(float), axis, window_secs)
+    # ventana completa: hay muestras desde al menos window_secs antes (mismo segmento)
+    if "segment_id" in df.columns:
+        seg_start = axis.groupby(_num(df, "segment_id").fillna(0.0)).transform("min")
+    else:
+        seg_start = axis.min()
+    roll = roll.where(axis - seg_start >= window_secs)
+    if roll.notna().sum() == 0:
+        return float("nan"), float("nan")
+    i = roll.idxmax()
+    return float(roll.loc[i]), float(_num(df, "elapsed_s").loc[i] - window_secs)
+
+
+def activity_summary(df: pd.DataFrame, name: str | None = None) -> dict:
+    """
+    Fila de resumen de una actividad ya procesada con add_metrics_minimal
+    (fecha, deporte, duración, TSS/FSS totales y mejores ventanas).
+    """
+    el = _num(df, "elapsed_s")
+    duration = float(el.max() - el.min()) if el.notna().any() else 0.0
+    sport = None
+    if "activity_sport" in df.columns and df["activity_sport"].notna().any():
+        sport = df["activity_sport"].dropna().iloc[0]
+
+    best_p, best_p_start = best_window_mean(_num(df, "power_w").where(lambda p: p >= 0), df, BEST_WINDOW_SECONDS)
+    best_v, best_v_start = best_window_mean(_num(df, "speed_kmh"), df, BEST_WINDOW_SECONDS)
 
-        w = dt_s.loc[seg.index].astype(float).clip(lower=0.0)
-        avg_int = _weighted_mean(intensity_series.loc[seg.index], w)
-        cv_int = _cv_weighted(intensity_series.loc[seg.index], w)
-
-        # HR coverage por ventana si aplica
-        hr_cov_w = None
-        if mode == "decoupling_valid":
-            hr_cov_w = _hr_coverage(hr_raw.loc[seg.index])
-            if hr_cov_w < min_hr_cov_window:
-                i += 1
-                continue
-            if np.isfinite(cv_int) and cv_int > max_cv_intensity:
-                i += 1
-                continue
-
-        # score según criterio
-        if criterion == "max_avg_if" or criterion == "max_avg_speed":
-            score = avg_int
-        else:
-            score = avg_int
-
-        if np.isfinite(score) and score > best["score"]:
-            best = {
-                "ok": True,
-                "start_s": float(seg["elapsed_s"].min()),
-                "end_s": float(seg["elapsed_s"].max()),
-                "score": float(score),
-                "cv_intensity": float(cv_int) if np.isfinite(cv_int) else float("nan"),
-                "hr_cov_window": float(hr_cov_w) if hr_cov_w is not None else None,
-            }
-
-        i += 1
-
-    return best
+    if name is None and "documento" in df.columns and len(df):
+        name = df["documento"].iloc[0]
+    summary = {
+        "actividad": name,
+        "fecha": df["fecha"].iloc[0] if "fecha" in df.columns and len(df) else None,
+        "deporte": sport,
+        "duracion_s": duration,
+        "TSS_total": float(df["TSS_total"].iloc[0]) if len(df) else 0.0,
+        "FSS_total": float(df["FSS_total"].iloc[0]) if len(df) else 0.0,
+        f"mejor_{BEST_WINDOW_SECONDS // 60}min_W": best_p,
+        f"mejor_{BEST_WINDOW_SECONDS // 60}min_inicio_s": best_p_start,
+        f"mejor_{BEST_WINDOW_SECONDS // 60}min_kmh": best_v,
+    }
+    if "moving_s" in df.columns and len(df):
+        summary["movimiento_s"] = float(df["moving_s"].iloc[-1])
+    for col in ("NP", "VI", "work_kJ"):
+        if col in df.columns and len(df):
+            summary[col] = float(df[col].iloc[0])
+    if "power_zone" in df.columns:
+        tiz = time_in_zones(df)
+        for k, secs in enumerate(tiz["power"], start=1):
+            summary[f"pot_Z{k}_s"] = secs
+        for k, secs in enumerate(tiz["hr"], start=1):
+            summary[f"fc_Z{k}_s"] = secs
+    return summary
@@ -129,3 +129,29 @@ def figure_to_html_bytes(fig) -> bytes:
     buf = StringIO()
     fig.write_html(buf, include_plotlyjs="cdn", full_html=True)
     return buf.getvalue().encode("utf-8")
+
+
+def make_plot_sweep_heatmap(grid, title: str, ftp_ref=None, fc20_ref=None) -> go.Figure:
+    """
+    Mapa de calor de FSS_total sobre la rejilla FTP × FC20 (tabla larga de
+    metrics.sweep_loads). Marca el punto de referencia si se indica.
+    """
+    pivot = grid.pivot(index="FC20", columns="FTP", values="FSS_total")
+    fig = go.Figure(go.Heatmap(
+        x=pivot.columns, y=pivot.index, z=pivot.values,
+        colorscale="Viridis", colorbar=dict(title="FSS"),
+        hovertemplate="FTP %{x:.0f} W<br>FC20 %{y:.0f} bpm<br>FSS %{z:.1f}<extra></extra>",
+    ))
+    if ftp_ref is not None and fc20_ref is not None:
+        fig.add_trace(go.Scatter(
+            x=[ftp_ref], y=[fc20_ref], mode="markers", name="Actual",
+            marker=dict(symbol="x", size=12, color="white"),
+        ))
+    fig.update_layout(
+        title=title,
+        xaxis=dict(title="FTP (W)"),
+        yaxis=dict(title="FC_20min_max (bpm)"),
+        template="plotly_white",
+        margin=dict(l=70, r=40, t=70, b=50),
+    )
+    return fig
@@ -0,0 +1,401 @@
+# =========================
+# made4try/service.py — Servicio HTTP de conversión (sin Streamlit)
+# =========================
+"""
+Servicio HTTP mínimo (solo stdlib) para convertir TCX desde otros sistemas:
+
+    python -m made4try.service --port 8080 --workers 2
+
+    POST /convert?ftp=265&fc20=170&format=xlsx|parquet|json&name=act.tcx.gz
+         [&clean=0] [&spikes=1]  (cuerpo = bytes del .tcx o .tcx.gz)
+    GET  /health
+    GET  /metrics   (contadores, aciertos de caché y latencias)
+
+Las conversiones corren en un pool de procesos acotado; los resultados se
+cachean por hash del contenido + parámetros.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Tuple
+
+import numpy as np
+
+from .cleaning import clean_activity
+from .config import (
+    DISPLAY_SMOOTH_SECONDS,
+    SERVICE_MAX_WORKERS, SERVICE_MAX_PENDING, SERVICE_CACHE_ITEMS,
+    SERVICE_TIMEOUT_S, SERVICE_MAX_UPLOAD_BYTES,
+)
+from .export_xlsx import dataframe_to_xlsx_bytes
+from .io_tcx import parse_tcx_source_to_rows, rows_to_dataframe
+from .metrics import add_metrics_minimal, activity_summary
+from .utils import clean_base_name
+
+CONTENT_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+    "json": "application/json",
+}
+
+
+class ServiceBusy(Exception):
+    """No hay hueco en la cola de conversiones (o el pool se está reiniciando)."""
+
+
+# ---------- Conversión (se ejecuta en los procesos del pool) ----------
+
+def _json_safe(obj: Any) -> Any:
+    """NaN/inf → None (null en JSON estándar) y escalares NumPy → tipos Python."""
+    if isinstance(obj, dict):
+        return {k: _json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_safe(v) for v in obj]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+def convert_bytes(
+    data: bytes,
+    name: str,
+    ftp: float,
+    fc20: float,
+    fmt: str = "xlsx",
+    smooth_secs: int = DISPLAY_SMOOTH_SECONDS,
+    clean: bool = True,
+    spikes: bool = False,
+) -> bytes:
+    """
+    Convierte el contenido de un .tcx/.tcx.gz a XLSX, Parquet (requiere pyarrow)
+    o JSON (resumen de la actividad). Lanza ValueError ante parámetros inválidos.
+    """
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"formato no soportado: {fmt!r} (usa xlsx, parquet o json)")
+    if not (ftp and ftp > 0 and fc20 and fc20 > 0):
+        raise ValueError("ftp y fc20 deben ser > 0")
+
+    df_raw = rows_to_dataframe(parse_tcx_source_to_rows(data, name))
+    if clean:
+        df_raw = clean_activity(df_raw, spikes=spikes)
+    df_final = add_metrics_minimal(
+        df_raw, base_name=clean_base_name(name), ftp=ftp, fc20=fc20, smooth_secs=smooth_secs
+    )
+
+    if fmt == "xlsx":
+        return dataframe_to_xlsx_bytes(df_final).getvalue()
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("el formato parquet requiere pyarrow instalado")
+        bio = BytesIO()
+        df_final.to_parquet(bio, index=False)
+        return bio.getvalue()
+    # allow_nan=False: JSON estándar (JSON.parse, Go...) no admite NaN/Infinity
+    summary = _json_safe(activity_summary(df_final))
+    return json.dumps(summary, default=str, ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+
+# ---------- Servicio: pool acotado + caché + métricas ----------
+
+class ConversionService:
+    """
+    Orquesta las conversiones: pool de procesos de 'max_workers', a lo sumo
+    'max_pending' conversiones admitidas a la vez (el resto recibe ServiceBusy),
+    caché LRU por hash de contenido y métricas de tiempos por petición.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = SERVICE_MAX_WORKERS,
+        max_pending: int = SERVICE_MAX_PENDING,
+        cache_items: int = SERVICE_CACHE_ITEMS,
+        timeout_s: float = SERVICE_TIMEOUT_S,
+    ):
+        self.max_workers = max_workers
+        self.timeout_s = timeout_s
+        self.cache_items = cache_items
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=1000)
+        self._counters = {"requests": 0, "conversions": 0, "cache_hits": 0, "errors": 0, "rejected": 0,
+                          "pool_restarts": 0}
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # bajo el lock: dos primeras peticiones concurrentes no crean dos pools
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        # Un worker muerto (OOM, segfault) deja el pool roto para siempre: se
+        # descarta y la siguiente petición crea uno nuevo
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self._counters["pool_restarts"] += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def cache_key(data: bytes, **params) -> str:
+        h = hashlib.sha256(data)
+        h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def convert(self, data: bytes, name: str, ftp: float, fc20: float, fmt: str = "xlsx",
+                smooth_secs: int = DISPLAY_SMOOTH_SECONDS, clean: bool = True,
+                spikes: bool = False) -> Tuple[bytes, bool]:
+        """
+        Devuelve (resultado, desde_cache). Lanza ServiceBusy (cola llena o pool roto,
+        que se recrea), TimeoutError o ValueError.
+        """
+        # el nombre base forma parte de la salida (XLSX 'documento', JSON 'actividad')
+        key = self.cache_key(data, name=clean_base_name(name), gz=name.lower().endswith(".gz"),
+                             ftp=ftp, fc20=fc20, fmt=fmt, smooth_secs=smooth_secs,
+                             clean=clean, spikes=spikes)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._counters["cache_hits"] += 1
+                return self._cache[key], True
+
+        if not self._slots.acquire(blocking=False):
+            self.count("rejected")
+            raise ServiceBusy("cola de conversiones llena")
+        pool = self.pool
+        try:
+            fut = pool.submit(convert_bytes, data, name, ftp, fc20, fmt, smooth_secs, clean, spikes)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard_pool(pool)
+            raise ServiceBusy("el pool de conversión se está reiniciando; reintenta")
+        except BaseException:
+            self._slots.release()
+            raise
+        # El hueco se libera cuando el future termina de verdad: una conversión en
+        # marcha no se puede cancelar y sigue ocupando un worker tras el timeout.
+        fut.add_done_callback(lambda _f: self._slots.release())
+        try:
+            out = fut.result(timeout=self.timeout_s)
+        except FuturesTimeout:
+            fut.cancel()
+            raise TimeoutError(f"la conversión superó {self.timeout_s:.0f} s")
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise ServiceBusy("un worker de conversión terminó de forma inesperada; reintenta")
+
+        with self._lock:
+            self._counters["conversions"] += 1
+            self._cache[key] = out
+            while len(self._cache) > self.cache_items:
+                self._cache.popitem(last=False)
+        return out, False
+
+    def count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def record(self, path: str, status: int, elapsed_s: float):
+        with self._lock:
+            self._counters["requests"] += 1
+            if status >= 400:
+                self._counters["errors"] += 1
+            self._latencies.append((path, status, elapsed_s))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lat = sorted(e for p, _, e in self._latencies if p == "/convert")
+            counters = dict(self._counters)
+            cached = len(self._cache)
+
+        def _pct(q: float) -> float | None:
+            return round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000.0, 1) if lat else None
+
+        return {
+            **counters,
+            "cache_items": cached,
+            "workers": self.max_workers,
+            "convert_latency_ms": {
+                "n": len(lat),
+                "mean": round(sum(lat) / len(lat) * 1000.0, 1) if lat else None,
+                "p50": _pct(0.50),
+                "p95": _pct(0.95),
+                "max": round(lat[-1] * 1000.0, 1) if lat else None,
+            },
+        }
+
+
+# ---------- HTTP ----------
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "made4try/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self) -> ConversionService:
+        return self.server.service  # type: ignore[attr-defined]
+
+    def log_message(self, fmt, *args):  # silencioso; las métricas van en /metrics
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str, extra: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (extra or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def _json(self, status: int, obj, extra: dict | None = None) -> int:
+        return self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json", extra)
+
+    def _reject(self, status: int, error: str) -> int:
+        # Respuesta antes de leer el cuerpo: se cierra la conexión para que keep-alive
+        # no interprete los bytes pendientes como la siguiente petición
+        self.close_connection = True
+        return self._json(status, {"error": error}, {"Connection": "close"})
+
+    def do_GET(self):
+        t0 = time.perf_counter()
+        path = urllib.parse.urlparse(self.path).path
+        if path == "/health":
+            status = self._json(200, {"status": "ok"})
+        elif path == "/metrics":
+            status = self._json(200, self.service.metrics())
+        else:
+            status = self._json(404, {"error": "no encontrado"})
+        self.service.record(path, status, time.perf_counter() - t0)
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/convert":
+            status = self._json(404, {"error": "no encontrado"})
+        else:
+            status = self._convert(url)
+        self.service.record(url.path, status, time.perf_counter() - t0)
+
+    def _convert(self, url) -> int:
+        q = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            ftp = float(q.get("ftp", 0))
+            fc20 = float(q.get("fc20", 0))
+            smooth = int(q.get("smooth", DISPLAY_SMOOTH_SECONDS))
+        except ValueError:
+            return self._reject(400, "ftp, fc20, smooth y Content-Length deben ser numéricos")
+        if length <= 0:
+            return self._reject(400, "cuerpo vacío: envía los bytes del .tcx/.tcx.gz")
+        if length > SERVICE_MAX_UPLOAD_BYTES:
+            return self._reject(413, "archivo demasiado grande")
+
+        data = self.rfile.read(length)
+        name = q.get("name", "actividad.tcx")
+        fmt = q.get("format", "xlsx").lower()
+        clean = q.get("clean", "1") not in ("0", "false", "no")
+        spikes = q.get("spikes", "0") in ("1", "true", "yes")
+        try:
+            out, cached = self.service.convert(data, name, ftp, fc20, fmt, smooth, clean, spikes)
+        except ValueError as e:
+            return self._json(400, {"error": str(e)})
+        except ServiceBusy as e:
+            return self._json(503, {"error": str(e)})
+        except TimeoutError as e:
+            return self._json(504, {"error": str(e)})
+        except Exception as e:
+            return self._json(422, {"error": f"no se pudo convertir: {e}"})
+
+        ext = "json" if fmt == "json" else fmt
+        return self._send(200, out, CONTENT_TYPES[fmt], {
+            "Content-Disposition": f'attachment; filename="{clean_base_name(name)}.{ext}"',
+            "X-Cache": "HIT" if cached else "MISS",
+        })
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8080,
+                service: ConversionService | None = None) -> ThreadingHTTPServer:
+    """
+    Crea el servidor HTTP (un hilo por petición; las conversiones van al pool).
+    Con port=0 se elige un puerto libre (útil en pruebas): ver server.server_address.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service or ConversionService()  # type: ignore[attr-defined]
+    return server
+
+
+def start_background(host: str = "127.0.0.1", port: int = 0,
+                     service: ConversionService | None = None) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Arranca el servidor en un hilo del propio proceso y devuelve (server, base_url).
+    Para pararlo: server.shutdown(); server.service.shutdown().
+    """
+    server = make_server(host, port, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    h, p = server.server_address[:2]
+    return server, f"http://{h}:{p}"
+
+
+def post_convert(base_url: str, data: bytes, name: str, ftp: float, fc20: float,
+                 fmt: str = "xlsx", timeout: float = SERVICE_TIMEOUT_S) -> Tuple[int, bytes, dict]:
+    """Cliente mínimo: POST /convert. Devuelve (status, cuerpo, cabeceras)."""
+    query = urllib.parse.urlencode({"ftp": ftp, "fc20": fc20, "format": fmt, "name": name})
+    req = urllib.request.Request(f"{base_url}/convert?{query}", data=data, method="POST",
+                                 headers={"Content-Type": "application/octet-stream"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read(), dict(resp.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, e.read(), dict(e.headers)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Servicio HTTP TCX → XLSX/Parquet/JSON")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--workers", type=int, default=SERVICE_MAX_WORKERS)
+    ap.add_argument("--max-pending", type=int, default=SERVICE_MAX_PENDING)
+    args = ap.parse_args(argv)
+
+    service = ConversionService(max_workers=args.workers, max_pending=args.max_pending)
+    server = make_server(args.host, args.port, service)
+    print(f"made4try service en http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,20 @@ from __future__ import annotations
 
 import os
 import re
-from typing import Optional, Any, Iterable
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Any, Iterable, Iterator, Callable, Tuple, TypeVar
 
+import numpy as np
 import pandas as pd
 
+from . import kernels
+from .config import SPOOL_MAX_BYTES
+
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 def clean_base_name(name: str) -> str:
     """
@@ -32,6 +42,33 @@ def clean_base_name(name: str) -> str:
     return base.strip() or "archivo"
 
 
+def member_base_name(path: str) -> str:
+    """
+    Como clean_base_name, pero conserva las carpetas de un miembro de ZIP para
+    que 'a/act.tcx' y 'b/act.tcx' no colisionen. Separadores de ruta -> '_'.
+    Ejemplos:
+        '2023/ride.tcx.gz'   -> '2023_ride'
+        'ride.tcx'           -> 'ride'
+    """
+    parts = [p.strip() for p in re.split(r"[\\/]+", path or "") if p.strip()]
+    if not parts:
+        return "archivo"
+    return "_".join(parts[:-1] + [clean_base_name(parts[-1])])
+
+
+def unique_name(name: str, used: set) -> str:
+    """
+    Devuelve 'name' o, si ya está en 'used', 'name_2', 'name_3', ...
+    El nombre devuelto se añade a 'used'.
+    """
+    candidate, k = name, 1
+    while candidate in used:
+        k += 1
+        candidate = f"{name}_{k}"
+    used.add(candidate)
+    return candidate
+
+
 def safe_div(a: float | int | None, b: float | int | None, default: Optional[float] = None) -> Optional[float]:
     """
     División segura que evita ZeroDivisionError y None.
@@ -62,3 +99,90 @@ def ensure_sorted_by(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
     if valid:
         df2 = df2.sort_values(valid).reset_index(drop=True)
     return df2
+
+
+def spooled_file(max_size: int | None = None) -> tempfile.SpooledTemporaryFile:
+    """
+    Buffer binario que vive en memoria hasta 'max_size' bytes (SPOOL_MAX_BYTES por
+    defecto) y pasa a un archivo temporal en disco si lo supera.
+    """
+    return tempfile.SpooledTemporaryFile(
+        max_size=SPOOL_MAX_BYTES if max_size is None else max_size, mode="w+b"
+    )
+
+
+def close_all(files: Iterable[Any]) -> None:
+    """Cierra archivos/buffers (p. ej. los spooled de un lote) ignorando los None."""
+    for f in files:
+        if f is not None:
+            f.close()
+
+
+def read_all(f) -> bytes:
+    """Lee completo un buffer/archivo binario desde el inicio (sin getvalue())."""
+    f.seek(0)
+    data = f.read()
+    f.seek(0)
+    return data
+
+
+def decimate_minmax_indices(values: Iterable[Any], max_points: int) -> np.ndarray:
+    """
+    Índices (ordenados) para diezmar una serie a ~max_points conservando picos:
+    se divide en cubetas y de cada una se toman el mínimo y el máximo.
+    Siempre incluye la primera y la última muestra. NaN no cuentan como extremos.
+    """
+    y = np.asarray(pd.to_numeric(pd.Series(values), errors="coerce"), dtype=float)
+    return kernels.decimate_minmax_indices(y, max_points)
+
+
+def bounded_parallel_map(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = 4,
+    *,
+    processes: bool = False,
+) -> Iterator[Tuple[T, R | Exception]]:
+    """
+    Aplica 'fn' en paralelo y produce (item, resultado) en el orden de entrada.
+    A lo sumo 'max_workers' items están en vuelo a la vez: 'items' se consume de
+    forma perezosa, así que la memoria queda acotada aunque la fuente sea enorme.
+    Si 'fn' lanza una excepción, se produce la excepción como resultado.
+
+    Por defecto usa hilos (útil para E/S). Con processes=True usa un pool de
+    procesos, necesario para trabajo de CPU que retiene el GIL (parseo XML,
+    pandas fila a fila, openpyxl); entonces 'fn' debe ser una función de nivel de
+    módulo y items y resultados deben ser picklables.
+    """
+    max_workers = max(1, int(max_workers))
+    if processes:
+        # más procesos que núcleos solo añade arranque y pickling
+        max_workers = min(max_workers, os.cpu_count() or 1)
+        if max_workers == 1:
+            yield from _serial_map(fn, items)
+            return
+    executor_cls = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_cls(max_workers=max_workers) as ex:
+        pending: deque = deque()
+        for item in items:
+            pending.append((item, ex.submit(fn, item)))
+            if len(pending) >= max_workers:
+                yield _pop_result(pending)
+        while pending:
+            yield _pop_result(pending)
+
+
+def _serial_map(fn: Callable[[T], R], items: Iterable[T]) -> Iterator[Tuple[T, R | Exception]]:
+    for item in items:
+        try:
+            yield item, fn(item)
+        except Exception as e:
+            yield item, e
+
+
+def _pop_result(pending: deque) -> Tuple[Any, Any]:
+    item, fut = pending.popleft()
+    try:
+        return item, fut.result()
+    except Exception as e:
+        return item, e
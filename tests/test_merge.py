@@ -0,0 +1,59 @@
+# =========================
+# tests/test_merge.py — Fusión de grabaciones y desfase de reloj
+# =========================
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from made4try.merge import estimate_clock_offset, merge_recordings
+
+N = 1800  # 30 min a 1 Hz
+T0 = pd.Timestamp("2024-01-01 08:00:00")
+
+
+def _session(seed: int = 0) -> pd.DataFrame:
+    """Sesión 'real' a 1 Hz: potencia ruidosa y FC que la sigue con retardo."""
+    rng = np.random.default_rng(seed)
+    power = np.clip(200 + np.cumsum(rng.normal(0, 8, N)) * 0.3 + rng.normal(0, 25, N), 0, None)
+    hr = 120 + pd.Series(power).rolling(30, min_periods=1).mean().to_numpy() * 0.2
+    return pd.DataFrame({"power_w": power, "hr_bpm": np.round(hr), "altitude_m": 100.0})
+
+
+def _recording(session: pd.DataFrame, cols, clock_shift_s: float = 0.0) -> pd.DataFrame:
+    t = T0 + pd.to_timedelta(np.arange(N) + clock_shift_s, unit="s")
+    df = session[list(cols)].copy()
+    df.insert(0, "time_utc", t)
+    df.insert(1, "elapsed_s", np.arange(N, dtype=float))
+    return df
+
+
+def test_synced_indoor_recordings_keep_zero_offset():
+    # ciclocomputador (potencia + altitud) y reloj (FC + altitud) en rodillo: altitud plana
+    s = _session()
+    head = _recording(s, ["power_w", "altitude_m"])
+    watch = _recording(s, ["hr_bpm", "altitude_m"])
+
+    assert estimate_clock_offset(head, watch) == 0.0
+    merged = merge_recordings([head, watch])
+    assert merged.attrs["clock_offsets_s"] == [0.0, 0.0]
+    assert merged["hr_bpm"].notna().sum() == N
+
+
+@pytest.mark.parametrize("shift", [45.0, -120.0])
+def test_shifted_clock_is_recovered(shift):
+    s = _session(1)
+    ref = _recording(s, ["power_w", "hr_bpm"])
+    other = _recording(s, ["hr_bpm", "altitude_m"], clock_shift_s=shift)
+
+    assert estimate_clock_offset(ref, other) == shift
+    merged = merge_recordings([ref, other])
+    assert merged.attrs["clock_offsets_s"][1] == shift
+
+
+def test_flat_shared_signals_fall_back_to_zero():
+    s = _session(2)
+    a = _recording(s, ["altitude_m"])
+    b = _recording(s, ["altitude_m"], clock_shift_s=30.0)
+    assert estimate_clock_offset(a, b) == 0.0
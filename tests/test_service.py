@@ -0,0 +1,109 @@
+# =========================
+# tests/test_service.py — Servicio HTTP de conversión
+# =========================
+from __future__ import annotations
+
+import http.client
+import json
+import urllib.parse
+from datetime import datetime, timedelta
+
+import pytest
+
+from made4try.service import ConversionService, post_convert, start_background
+
+
+def _tcx_bytes(n: int = 300) -> bytes:
+    t0 = datetime(2024, 1, 1, 8, 0, 0)
+    points = "".join(
+        f"<Trackpoint><Time>{(t0 + timedelta(seconds=i)).isoformat()}Z</Time>"
+        f"<HeartRateBpm><Value>{140 + i % 5}</Value></HeartRateBpm>"
+        f"<Extensions><ns3:TPX><ns3:Watts>{200 + i % 20}</ns3:Watts></ns3:TPX></Extensions>"
+        f"</Trackpoint>"
+        for i in range(n)
+    )
+    return (
+        '<?xml version="1.0"?>'
+        '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2" '
+        'xmlns:ns3="http://www.garmin.com/xmlschemas/ActivityExtension/v2"><Activities>'
+        f'<Activity Sport="Biking"><Id>{t0.isoformat()}Z</Id><Lap StartTime="{t0.isoformat()}Z">'
+        f"<Track>{points}</Track></Lap></Activity></Activities></TrainingCenterDatabase>"
+    ).encode("utf-8")
+
+
+def _strict_json(body: bytes):
+    """json.loads sin la extensión de Python que acepta NaN/Infinity."""
+    def _reject(token):
+        raise ValueError(f"token JSON no estándar: {token}")
+    return json.loads(body, parse_constant=_reject)
+
+
+@pytest.fixture
+def service_url():
+    server, url = start_background(service=ConversionService(max_workers=1))
+    yield url
+    server.shutdown()
+    server.server_close()
+    server.service.shutdown()
+
+
+def test_convert_roundtrip_and_cache_by_name(service_url):
+    data = _tcx_bytes()
+
+    status, body, headers = post_convert(service_url, data, "ride.tcx", 250, 170, fmt="json")
+    assert status == 200
+    assert headers["X-Cache"] == "MISS"
+    summary = _strict_json(body)
+    assert summary["actividad"] == "ride"
+    assert summary["TSS_total"] > 0
+    # actividad < 20 min: sin mejor ventana, null en lugar de NaN
+    assert summary["mejor_20min_W"] is None
+
+    # mismo contenido y nombre: desde caché
+    status, body_hit, headers = post_convert(service_url, data, "ride.tcx", 250, 170, fmt="json")
+    assert status == 200 and headers["X-Cache"] == "HIT"
+    assert body_hit == body
+
+    # mismo contenido con otro nombre: la salida cambia, no puede venir de caché
+    status, body, headers = post_convert(service_url, data, "otra.tcx", 250, 170, fmt="json")
+    assert status == 200 and headers["X-Cache"] == "MISS"
+    assert _strict_json(body)["actividad"] == "otra"
+
+
+def test_rejected_upload_closes_connection(service_url):
+    host, port = urllib.parse.urlparse(service_url).netloc.split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=10)
+    try:
+        # ftp inválido: 400 sin leer el cuerpo, y la conexión no se reutiliza
+        conn.request("POST", "/convert?ftp=x&fc20=170", body=_tcx_bytes(50))
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 400
+        assert resp.getheader("Connection") == "close"
+        assert resp.will_close
+    finally:
+        conn.close()
+
+
+def test_broken_worker_pool_is_recreated():
+    service = ConversionService(max_workers=1)
+    server, url = start_background(service=service)
+    try:
+        data = _tcx_bytes()
+        assert post_convert(url, data, "a.tcx", 250, 170, fmt="json")[0] == 200
+
+        # simula un worker muerto (OOM/segfault): el pool queda roto
+        for proc in list(service.pool._processes.values()):
+            proc.kill()
+            proc.join()
+
+        status, _, _ = post_convert(url, data, "b.tcx", 250, 170, fmt="json")
+        assert status in (200, 503)
+        status, body, _ = post_convert(url, data, "c.tcx", 250, 170, fmt="json")
+        assert status == 200
+        assert _strict_json(body)["actividad"] == "c"
+        assert service.metrics()["pool_restarts"] >= 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()